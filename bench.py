@@ -0,0 +1,317 @@
+"""
+绘制路径的无窗口性能测试。
+
+在 SDL_VIDEODRIVER=dummy 下按脚本驱动窗口、绘图区和侧边栏，
+统计各绘制方法每次调用耗时的p50/p99和内存分配，并把结果保存为JSON以便在不同提交之间比较。
+
+    python bench.py                      # 运行全部场景，结果写入 bench.json
+    python bench.py -s home slider -n 300
+    python bench.py -o new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+import pygame
+
+import main
+
+# 被测的方法：(对象名, 方法名)
+METHODS = [('window', 'draw_frame'), ('window', 'update'), ('window', 'resize'),
+           ('graph', 'draw'), ('graph', 'draw_layer'), ('graph', 'draw_overlay'), ('graph', 'grid_tile'),
+           ('sidebar', 'draw'), ('sidebar', 'layout')]
+
+
+class Bench:
+    """
+    一次测试用的程序实例：所有被测方法都包上计时（和可选的内存统计）。
+    """
+
+    def __init__(self, config_path: str, trace: bool) -> None:
+        self.trace = trace
+        self.samples = defaultdict(list)
+        self.allocs = defaultdict(list)
+        self.surfaces = defaultdict(list)
+        self.window = main.Window(main.Config(config_path))
+        self.graph = main.Graph(self.window)
+        self.sidebar = main.Sidebar(self.window, self.graph)
+        for owner, name in METHODS:
+            self.instrument(getattr(self, owner), name)
+
+    def label(self, obj, name: str) -> str:
+        label = f'{type(obj).__name__}.{name}'
+        # 侧边栏按页面分别统计
+        if obj is self.sidebar:
+            label += f'[{self.sidebar.page}]'
+        return label
+
+    def instrument(self, obj, name: str) -> None:
+        method = getattr(obj, name)
+
+        def timed(*args, **kwargs):
+            label = self.label(obj, name)
+            if self.trace:
+                surfaces = main.surface_count
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            self.samples[label].append(time.perf_counter()-start)
+            if self.trace:
+                self.allocs[label].append(
+                    tracemalloc.get_traced_memory()[1]-before)
+                self.surfaces[label].append(
+                    main.surface_count-surfaces)
+            return result
+        setattr(obj, name, timed)
+
+    def frame(self) -> None:
+        self.window.draw_frame()
+        self.graph.draw()
+        self.sidebar.draw()
+        self.window.draw_dialogs()
+        self.window.update()
+
+    def open(self, page: str) -> None:
+        self.sidebar.open(page)
+        # 跳过翻页动画
+        self.sidebar.transition.start -= 1
+
+    def reset(self) -> None:
+        self.samples.clear()
+        self.allocs.clear()
+        self.surfaces.clear()
+
+
+def drag(bench: Bench, slider: main.Slider, t: float) -> None:
+    """
+    模拟按住滑块拖动到位置t（0~1，来回往复）。
+    """
+    t = 1-abs(1-t % 2)
+    slider.setting = True
+    slider.click_pos = (-1, -1)
+    bench.window.mouse_pos = (int(slider.bar_rect.left+slider.size/2+(slider.length-slider.size)*t),
+                              slider.bar_rect.centery)
+
+
+def scenario_home(bench: Bench, frames: int) -> None:
+    """
+    静止的主页。
+    """
+    bench.open('home')
+    for i in range(frames):
+        bench.frame()
+
+
+def scenario_slider(bench: Bench, frames: int) -> None:
+    """
+    依次拖动a、b、c三个滑块。
+    """
+    bench.open('home')
+    bench.frame()
+    for i in range(frames):
+        slider = bench.sidebar.sliders[('a_slider', 'b_slider', 'c_slider')[
+            i*3//frames]]
+        drag(bench, slider, i/40)
+        bench.frame()
+        slider.setting = False
+
+
+def scenario_theme(bench: Bench, frames: int) -> None:
+    """
+    每帧切换主题颜色。
+    """
+    bench.open('home')
+    for i in range(frames):
+        bench.window.apply_main_color(('#ffffff', '#ff8800')[i % 2])
+        bench.frame()
+
+
+def scenario_mask(bench: Bench, frames: int) -> None:
+    """
+    图片背景下拖动蒙版不透明度滑块。
+    """
+    path = os.path.join(tempfile.gettempdir(), 'bench_background.png')
+    x, y = np.meshgrid(np.arange(main.WINDOW_SIZE[0]),
+                       np.arange(main.WINDOW_SIZE[1]), indexing='ij')
+    pixels = np.stack((x % 256, y % 256, (x+y) % 256), -1).astype(np.uint8)
+    pygame.image.save(pygame.surfarray.make_surface(pixels), path)
+    bench.window.load_bg_image(path)
+    deadline = time.perf_counter()+10
+    while bench.window.background != path:
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f'背景图片加载超时: {path}')
+        event = pygame.event.wait(1000)
+        if event.type == main.BG_LOADED:
+            # 事件队列里可能还有之前加载的通知，只看本次加载的结果
+            loaded = bench.window.bg_loaded
+            if loaded and loaded[0] == bench.window.bg_token and loaded[2] is None:
+                raise RuntimeError(f'背景图片加载失败: {path}')
+            bench.window.finish_bg_image()
+    bench.open('settings')
+    bench.frame()
+    slider = bench.sidebar.sliders['change_mask_alpha']
+    for i in range(frames):
+        drag(bench, slider, i/40)
+        bench.frame()
+    slider.setting = False
+
+
+def scenario_calc(bench: Bench, frames: int) -> None:
+    """
+    已设置三个点的计算页。
+    """
+    bench.open('calc')
+    bench.graph.set_points({1: (-3, 4), 2: (1, -2), 3: (4, 6)})
+    for i in range(frames):
+        bench.frame()
+
+
+def scenario_pan(bench: Bench, frames: int) -> None:
+    """
+    平移并缩放绘图区。
+    """
+    bench.open('home')
+    origin = bench.graph.origin_pos
+    for i in range(frames):
+        if i % 20 == 0:
+            bench.graph.zoom_view((300, 300), 1 if i % 80 < 40 else -1)
+        bench.graph.move_view((origin[0]+i % 50*3, origin[1]-i % 30*2))
+        bench.frame()
+
+
+def scenario_pinned(bench: Bench, frames: int) -> None:
+    """
+    固定300条曲线后拖动滑块，再平移绘图区。
+    """
+    bench.open('home')
+    graph = bench.graph
+    graph.pinned = tuple(((i-150)/50, i % 7-3, i % 11-5, main.PIN_COLORS[i % len(main.PIN_COLORS)])
+                         for i in range(300))
+    bench.frame()
+    slider = bench.sidebar.sliders['a_slider']
+    for i in range(frames//2):
+        drag(bench, slider, i/40)
+        bench.frame()
+    slider.setting = False
+    origin = graph.origin_pos
+    for i in range(frames-frames//2):
+        graph.move_view((origin[0]+i % 50*3, origin[1]-i % 30*2))
+        bench.frame()
+
+
+def scenario_resize(bench: Bench, frames: int) -> None:
+    """
+    每20帧改变一次窗口大小（图层只应在改变时重新生成一次）。
+    """
+    bench.open('home')
+    sizes = ((1000, 600), (1600, 900), (1280, 720), (1920, 1080))
+    for i in range(frames):
+        if i % 20 == 0:
+            bench.window.resize(sizes[i//20 % len(sizes)])
+        bench.frame()
+    bench.window.resize(main.MIN_WINDOW_SIZE)
+
+
+SCENARIOS = {'home': scenario_home, 'slider': scenario_slider, 'theme': scenario_theme,
+             'mask': scenario_mask, 'calc': scenario_calc, 'pan': scenario_pan,
+             'pinned': scenario_pinned, 'resize': scenario_resize}
+
+
+def run(name: str, frames: int, trace: bool) -> Bench:
+    directory = tempfile.mkdtemp()
+    config = os.path.join(directory, 'config.ini')
+    if trace:
+        tracemalloc.start()
+    try:
+        bench = Bench(config, trace)
+        # 预热：填充各级缓存后再开始统计
+        SCENARIOS[name](bench, max(1, frames//10))
+        bench.reset()
+        SCENARIOS[name](bench, frames)
+    finally:
+        if trace:
+            tracemalloc.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+    return bench
+
+
+def summarize(timing: Bench, memory: Bench) -> dict:
+    result = {}
+    for label, samples in sorted(timing.samples.items()):
+        ms = np.array(samples)*1000
+        result[label] = {'calls': len(samples),
+                         'p50_ms': round(float(np.percentile(ms, 50)), 4),
+                         'p99_ms': round(float(np.percentile(ms, 99)), 4),
+                         'mean_ms': round(float(ms.mean()), 4)}
+        if memory.allocs[label]:
+            result[label]['alloc_kb'] = round(
+                float(np.mean(memory.allocs[label]))/1024, 2)
+            result[label]['surfaces'] = round(
+                float(np.mean(memory.surfaces[label])), 2)
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def report(results: dict, base: dict = None) -> str:
+    lines = [f'{"method":<28}{"calls":>6}{"p50 ms":>9}{"p99 ms":>9}{"alloc KB":>10}{"surf":>6}'
+             + ('  p50 vs base' if base else '')]
+    for scenario, methods in results.items():
+        lines.append(f'[{scenario}]')
+        for label, m in methods.items():
+            line = (f'  {label:<26}{m["calls"]:>6}{m["p50_ms"]:>9.3f}{m["p99_ms"]:>9.3f}'
+                    f'{m.get("alloc_kb", 0):>10.2f}{m.get("surfaces", 0):>6.1f}')
+            old = (base or {}).get(scenario, {}).get(label)
+            if old and old['p50_ms']:
+                line += f'  {m["p50_ms"]/old["p50_ms"]:>6.2f}x'
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='绘制路径的无窗口性能测试')
+    parser.add_argument('-s', '--scenario', nargs='+', choices=list(SCENARIOS),
+                        default=list(SCENARIOS), help='要运行的场景')
+    parser.add_argument('-n', '--frames', type=int,
+                        default=200, help='每个场景统计的帧数')
+    parser.add_argument('-o', '--output', default='bench.json',
+                        help='结果文件')
+    parser.add_argument('--compare', help='与之前保存的结果文件比较p50')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenario:
+        # 计时和内存统计分两遍运行，避免tracemalloc的开销影响计时
+        timing = run(name, args.frames, False)
+        memory = run(name, max(1, args.frames//4), True)
+        results[name] = summarize(timing, memory)
+    base = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            base = json.load(f)['scenarios']
+    print(report(results, base))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'meta': {'commit': git_commit(), 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                            'frames': args.frames, 'python': platform.python_version(),
+                            'pygame': pygame.version.ver, 'sdl': '.'.join(map(str, pygame.get_sdl_version())),
+                            'platform': platform.platform()},
+                   'scenarios': results}, f, ensure_ascii=False, indent=1)
+    pygame.quit()
@@ -1,5 +1,7 @@
 @echo off
+pipenv run python main.py atlas -o glyphs
 pipenv run pyinstaller main.spec
 move dist\main.exe ʾ.exe
 rd /s /q build
-rd /s /q dist
\ No newline at end of file
+rd /s /q dist
+rd /s /q glyphs
\ No newline at end of file
@@ -1,17 +1,70 @@
+import argparse
+import ast
+import colorsys
+import ctypes
+import hashlib
+import io
+import itertools
+import json
+import math
 import os
+import queue
 import sys
+import threading
 import time
-import tkinter
-import tkinter.colorchooser
+import zlib
+from collections import OrderedDict
+from fractions import Fraction
 from configparser import ConfigParser
 
-import easygui
+START_TIME = time.perf_counter()
+# 批量分析的结果可能输出到标准输出，不打印pygame的欢迎信息
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+# Windows在高DPI屏幕上会把不声明DPI感知的窗口整体放大而变模糊，声明后按实际像素绘制，界面由UI_SCALE放大
+os.environ.setdefault('SDL_WINDOWS_DPI_AWARENESS', 'permonitorv2')
+
+import numpy as np
 import pygame
 
-WINDOW_SIZE = (1000, 600)
+# 窗口可以改变大小：WINDOW_SIZE为当前尺寸，侧边栏靠右，绘图区占满其余部分（由set_window_size更新）
+# 界面按最小窗口尺寸设计，UI_SCALE为当前的界面缩放，字号、侧边栏宽度、控件尺寸和图标都按它放大（见scaled）；
+# 界面缩放随窗口尺寸按UI_SCALE_STEP分档变化，且不小于系统的显示缩放DISPLAY_SCALE
+MIN_WINDOW_SIZE = (1000, 600)
+SIDEBAR_WIDTH = 400
+UI_SCALE_STEP = 0.25
+DISPLAY_SCALE = 1.0
+UI_SCALE = 1.0
+WINDOW_SIZE = MIN_WINDOW_SIZE
 WINDOW_TITLE = '抛物线演示器'
-SIDEBAR_LEFT = WINDOW_SIZE[0]-400
+SIDEBAR_LEFT = WINDOW_SIZE[0]-SIDEBAR_WIDTH
 SIDEBAR_MID = (SIDEBAR_LEFT+WINDOW_SIZE[0])//2
+# 拖动窗口边框时，尺寸停止变化这么久（秒）之后才重新排版和生成图层
+RESIZE_DELAY = 0.2
+TEXT_CACHE_SIZE = 512
+FONT_FILES = ('FZFWQingYinTiJWL.ttf', 'CascadiaCode.ttf')
+# 字形图集缓存在用户目录下（Windows为%LOCALAPPDATA%），与启动时的工作目录无关；
+# 打包时预先生成的图集放在程序资源的GLYPH_BUNDLE_DIR中，用户缓存中没有时使用
+GLYPH_CACHE_DIR = os.path.join(os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME')
+                               or os.path.join(os.path.expanduser('~'), '.cache'), 'parabola', 'glyphs')
+GLYPH_BUNDLE_DIR = 'glyphs'
+BG_LOADED = pygame.USEREVENT+1
+RECORD_DONE = pygame.USEREVENT+2
+# 性能分析：每帧依次计时的阶段、统计的计数器、浮层保留的帧数和各阶段的颜色
+PROFILE_PHASES = ('events', 'draw_frame', 'graph.draw',
+                  'sidebar.draw', 'dialogs', 'update')
+PROFILE_COUNTERS = ('text_hits', 'text_misses', 'glyph_hits',
+                    'glyph_misses', 'surfaces', 'config_writes')
+PROFILE_HISTORY = 240
+PROFILE_COLORS = ((255, 193, 7), (96, 125, 139), (0, 188, 212),
+                  (139, 195, 74), (156, 39, 176), (244, 67, 54))
+# 固定曲线依次使用的颜色、固定曲线图层四周多绘制的边距（平移不超过边距时不必重绘）和图例最多列出的条数
+PIN_COLORS = ((244, 67, 54), (33, 150, 243), (76, 175, 80), (255, 152, 0), (156, 39, 176),
+              (0, 188, 212), (233, 30, 99), (139, 195, 74), (121, 85, 72), (63, 81, 181))
+PIN_MARGIN = 200
+PIN_LEGEND = 6
+# 参数动画每秒的固定步数（录制时每步一帧）、录制队列最多积压的帧数
+SWEEP_RATE = 30
+RECORD_QUEUE = 8
 try:
     RESOURCES = sys._MEIPASS
 except:
@@ -23,34 +76,1018 @@ def my_round(x, n=0):
     return int(x) if int(x) == x else x
 
 
-def gcd(a, b):
-    while b:
-        a, b = b, a % b
-    return a
+def set_window_size(size: tuple) -> tuple:
+    """
+    更新窗口尺寸（不小于按显示缩放放大的最小尺寸）、界面缩放及侧边栏位置，返回实际尺寸。
+    """
+    global WINDOW_SIZE, UI_SCALE, ZOOM_LEVELS, SIDEBAR_LEFT, SIDEBAR_MID
+    WINDOW_SIZE = (max(round(MIN_WINDOW_SIZE[0]*DISPLAY_SCALE), size[0]),
+                   max(round(MIN_WINDOW_SIZE[1]*DISPLAY_SCALE), size[1]))
+    fit = min(WINDOW_SIZE[0]/MIN_WINDOW_SIZE[0],
+              WINDOW_SIZE[1]/MIN_WINDOW_SIZE[1])
+    UI_SCALE = max(DISPLAY_SCALE, fit//UI_SCALE_STEP*UI_SCALE_STEP)
+    ZOOM_LEVELS = zoom_levels(UI_SCALE)
+    SIDEBAR_LEFT = WINDOW_SIZE[0]-scaled(SIDEBAR_WIDTH)
+    SIDEBAR_MID = (SIDEBAR_LEFT+WINDOW_SIZE[0])//2
+    return WINDOW_SIZE
+
+
+def detect_display_scale() -> float:
+    """
+    读取系统的显示缩放（Windows按系统DPI计算，其他系统由SDL按逻辑像素处理，视为1），须在初始化显示模块之后调用。
+    """
+    global DISPLAY_SCALE
+    try:
+        DISPLAY_SCALE = max(1.0, ctypes.windll.user32.GetDpiForSystem()/96)
+    except:
+        DISPLAY_SCALE = 1.0
+    return DISPLAY_SCALE
+
+
+def scaled(value):
+    """
+    把按最小窗口尺寸设计的长度（或长度组成的元组）换算成当前界面缩放下的像素数。
+    """
+    if isinstance(value, tuple):
+        return tuple(scaled(x) for x in value)
+    return round(value*UI_SCALE)
+
+
+def font_size(size: int) -> int:
+    """
+    字号等级对应的像素字号。
+    """
+    return scaled(18+size*8)
+
+
+surface_count = 0
+
+
+def counted(surface: pygame.Surface, n: int = 1) -> pygame.Surface:
+    """
+    统计本程序创建的Surface个数（供性能分析使用），原样返回surface。
+    n为得到surface时创建的Surface个数，例如Surface(...).convert()为2。
+    """
+    global surface_count
+    surface_count += n
+    return surface
+
+
+def format_formula(a, b, c) -> str:
+    """
+    函数解析式的文字。
+    """
+    ret = ''
+
+    if a == 1:
+        ret += 'x²'
+    elif a == -1:
+        ret += '-x²'
+    elif abs(a) >= 0.0001:
+        ret += f'{my_round(a,4 if abs(a) < 0.01 else 3 if abs(a) < 0.1 else 2)}x²'
+
+    if ret and b > 0:
+        ret += '+'
+    if b == 1:
+        ret += 'x'
+    elif b == -1:
+        ret += '-x'
+    elif b:
+        ret += f'{my_round(b,1)}x'
+
+    if ret and c > 0:
+        ret += '+'
+    if c or not ret:
+        ret += f'{my_round(c, 1)}'
+
+    return 'y='+ret
+
+
+def zoom_levels(ui_scale: float = 1.0) -> list:
+    """
+    生成缩放级别，每级为(每单位长度的像素数, 主网格间隔)。
+    主网格间隔取1、2、5系列，主网格线相距50~80像素（按界面缩放放大）且为5的倍数，保证次网格线落在整像素上。
+    各界面缩放下的级别数相同，同一序号的级别主网格间隔相同。
+    """
+    levels = {}
+    for e in range(3, -3, -1):
+        for m in (5, 2, 1):
+            step = m*10**e
+            for px in (50, 60, 80):
+                px = round(px*ui_scale/5)*5
+                levels[round(px/step, 6)] = step
+    return sorted(levels.items())
+
+
+ZOOM_LEVELS = zoom_levels()
+DEFAULT_ZOOM = [scale for scale, step in ZOOM_LEVELS].index(10)
+
+
+def det3(m) -> int:
+    """
+    3×3矩阵的行列式。
+    """
+    return (m[0][0]*(m[1][1]*m[2][2]-m[1][2]*m[2][1])
+            - m[0][1]*(m[1][0]*m[2][2]-m[1][2]*m[2][0])
+            + m[0][2]*(m[1][0]*m[2][1]-m[1][1]*m[2][0]))
+
+
+class QuadraticFit:
+    """
+    用正规方程的累加和拟合二次函数y=ax²+bx+c：增删一个点只需O(1)更新累加和，求解只需解一个3×3方程组。
+    三个点时得到过这三点的抛物线，更多点时得到最小二乘解；坐标为整数或分数时结果是精确的分数。
+    """
+
+    def __init__(self, points=()) -> None:
+        self.version = 0
+        self.clear()
+        for x, y in points:
+            self.add(x, y)
+
+    def clear(self) -> None:
+        # sums[i]为Σxⁱ(i=0~4)，xy[i]为Σxⁱy(i=0~2)，yy为Σy²
+        self.sums = [0]*5
+        self.xy = [0]*3
+        self.yy = 0
+        self.version += 1
+        self.result = None
+
+    def update(self, x, y, sign: int) -> None:
+        # 小数转为分数，保证删除点后累加和能精确复原
+        x, y = (i if isinstance(i, (int, Fraction)) else Fraction(i)
+                for i in (x, y))
+        power = 1
+        for i in range(5):
+            self.sums[i] += sign*power
+            if i < 3:
+                self.xy[i] += sign*power*y
+            power *= x
+        self.yy += sign*y*y
+        self.version += 1
+
+    def add(self, x, y) -> None:
+        self.update(x, y, 1)
+
+    def remove(self, x, y) -> None:
+        self.update(x, y, -1)
+
+    def count(self) -> int:
+        return self.sums[0]
+
+    def solve(self) -> tuple:
+        """
+        返回(a, b, c, 残差平方和)，均为Fraction；横坐标不同的点少于三个时返回None。
+        """
+        if self.result and self.result[0] == self.version:
+            return self.result[1]
+        s0, s1, s2, s3, s4 = self.sums
+        t0, t1, t2 = self.xy
+        # 正规方程：[[s4,s3,s2],[s3,s2,s1],[s2,s1,s0]]·(a,b,c) = (t2,t1,t0)，用克拉默法则求解
+        m = [[s4, s3, s2], [s3, s2, s1], [s2, s1, s0]]
+        det = det3(m)
+        if det == 0:
+            solution = None
+        else:
+            a, b, c = (Fraction(det3([row[:i]+[t]+row[i+1:] for row, t in zip(m, (t2, t1, t0))]), det)
+                       for i in range(3))
+            solution = (a, b, c, self.yy-(a*t2+b*t1+c*t0))
+        self.result = (self.version, solution)
+        return solution
+
+
+class ParabolaAnalysis:
+    """
+    二次函数y=ax²+bx+c（a不为0）的性质：对称轴x=h、顶点(h,k)、判别式和与x轴的交点。
+    a>0时开口向上，顶点为最低点，x<h时y随x的增大而减小，x>h时y随x的增大而增大；a<0时相反。
+    """
+
+    def __init__(self, a: float, b: float, c: float) -> None:
+        self.a, self.b, self.c = a, b, c
+        self.h = -b/a/2
+        self.k = c-b**2/a/4
+        self.delta = b**2-4*a*c
+        if self.delta > 0:
+            root = math.sqrt(self.delta)
+            self.roots = ((-b-root)/a/2, (-b+root)/a/2)
+        elif self.delta == 0:
+            self.roots = (-b/a/2,)
+        else:
+            self.roots = ()
+        self.opens_up = a > 0
+
+
+def analyze_batch(a, b, c) -> dict:
+    """
+    ParabolaAnalysis的向量化版本：输入a、b、c数组，返回h、k、delta、x1、x2、count（交点个数）、opens_up数组。
+    没有的交点为NaN（只有一个交点时x1=x2），a为0的行h、k也为NaN，count为0。
+    """
+    a, b, c = np.broadcast_arrays(*(np.asarray(i, float) for i in (a, b, c)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quadratic = a != 0
+        h = np.where(quadratic, -b/a/2, np.nan)
+        k = np.where(quadratic, c-b**2/a/4, np.nan)
+        delta = b**2-4*a*c
+        count = np.where(quadratic, np.sign(delta)+1, 0).astype(np.int8)
+        root = np.sqrt(np.where(count > 0, delta, np.nan))
+        x1 = (-b-root)/a/2
+        x2 = (-b+root)/a/2
+    # 加0.0把-0.0变为0.0
+    return {'h': h+0.0, 'k': k+0.0, 'delta': delta, 'x1': x1+0.0, 'x2': x2+0.0,
+            'count': count, 'opens_up': a > 0}
+
+
+def hsv_to_rgb(h, s, v) -> np.ndarray:
+    """
+    把HSV数组（取值均为0~1）转换为RGB数组，结果的最后一维为(r, g, b)。
+    """
+    h, s, v = np.broadcast_arrays(*(np.asarray(x, float) for x in (h, s, v)))
+    i = np.floor(h*6) % 6
+    f = h*6-np.floor(h*6)
+    p, q, t = v*(1-s), v*(1-s*f), v*(1-s*(1-f))
+    r = np.choose(i.astype(int), [v, q, p, p, t, v])
+    g = np.choose(i.astype(int), [t, v, v, q, p, p])
+    b = np.choose(i.astype(int), [p, p, t, v, v, q])
+    return np.stack((r, g, b), -1)
+
+
+def hex_color(color) -> str:
+    return '#%02x%02x%02x' % tuple(color)
+
+
+class StartupTimer:
+    """
+    记录启动各阶段的耗时。
+    """
+
+    def __init__(self) -> None:
+        self.phases = []
+        self.last = START_TIME
+
+    def mark(self, name: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((name, now-self.last))
+        self.last = now
+
+    def report(self) -> str:
+        lines = ['启动耗时:']
+        for name, t in self.phases:
+            lines.append(f'  {name:<12}{t*1000:8.1f} ms')
+        lines.append(f'  {"total":<12}{(self.last-START_TIME)*1000:8.1f} ms')
+        return '\n'.join(lines)
+
+
+startup = StartupTimer()
+
+
+def ui_chars() -> str:
+    """
+    收集源码中字符串常量用到的字符（不含文档字符串），作为预先生成的字形图集的内容（打包前调用）。
+    """
+    chars = set(' 0123456789.,:;()+-=<>²')
+    try:
+        with open(__file__, encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+    except:
+        return ''.join(sorted(chars))
+    docstrings = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef)) and node.body \
+                and isinstance(node.body[0], ast.Expr) and isinstance(node.body[0].value, ast.Constant):
+            docstrings.add(id(node.body[0].value))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in docstrings:
+            chars.update(c for c in node.value if c.isprintable())
+    return ''.join(sorted(chars))
+
+
+def fileopenbox(msg):
+    # 选择文件仍使用系统对话框，只在第一次使用时导入
+    import easygui
+    return easygui.fileopenbox(msg)
+
+
+class Config(ConfigParser):
+    """
+    配置存储：修改只标记为待写入，合并后延迟由一个常驻的后台线程写回磁盘。
+    """
+
+    def __init__(self, path: str = 'config.ini', delay: float = 1.0) -> None:
+        # lock保护配置内容和写入计划，写文件时只持有writing，不阻塞界面线程的修改
+        self.lock = threading.RLock()
+        self.wake = threading.Condition(self.lock)
+        self.writing = threading.Lock()
+        super().__init__()
+        # path为None时只保存在内存中（离屏导出时使用）
+        self.path = path
+        self.delay = delay
+        self.dirty = False
+        # 计划写入的时刻（time.monotonic），None表示没有待写入的修改
+        self.deadline = None
+        self.writer = None
+        self.writes = 0
+
+    def load(self) -> None:
+        if os.path.isfile(self.path):
+            try:
+                self.read(self.path, encoding='utf-8')
+            except:
+                pass
+
+    def set(self, section: str, option: str, value: str = None) -> None:
+        with self.lock:
+            if self.has_option(section, option) and self.get(section, option, raw=True) == value:
+                return
+            super().set(section, option, value)
+            self.dirty = True
+
+    def save(self, delay: float = None) -> None:
+        """
+        在一段时间内（默认为self.delay）没有新的修改后由后台线程写入文件，delay为0时尽快写入。
+        """
+        with self.lock:
+            if not self.dirty or self.path is None:
+                return
+            self.deadline = time.monotonic() + \
+                (self.delay if delay is None else delay)
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.run, daemon=True)
+                self.writer.start()
+            self.wake.notify()
+
+    def run(self) -> None:
+        """
+        写入线程：等到计划的时刻再写入，期间的新修改会推迟这个时刻。
+        """
+        while True:
+            with self.lock:
+                while self.deadline is None or time.monotonic() < self.deadline:
+                    self.wake.wait(None if self.deadline is None else
+                                   self.deadline-time.monotonic())
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        立即写入文件（先写临时文件再替换，避免写到一半的配置文件）。
+        在锁内只复制配置内容，写文件时其他线程仍可修改配置。
+        """
+        with self.writing:
+            with self.lock:
+                self.deadline = None
+                if not self.dirty or self.path is None:
+                    return
+                text = io.StringIO()
+                self.write(text)
+                self.dirty = False
+            try:
+                with open(self.path+'.tmp', 'w', encoding='utf-8') as f:
+                    f.write(text.getvalue())
+                os.replace(self.path+'.tmp', self.path)
+            except OSError:
+                # 写入失败时保留待写入标记，下次修改时再试
+                with self.lock:
+                    self.dirty = True
+                return
+            self.writes += 1
+
+
+class Observable:
+    """
+    可观察的状态：WATCHED中的属性被赋予不同的值时，版本号加一并通知订阅了该属性的回调。
+    依赖这些状态的缓存只需比较版本号，不必每帧比较或重新计算。
+    """
+    WATCHED = ()
+    version = 0
+    subscribers = None
+
+    def __setattr__(self, name: str, value) -> None:
+        if name in self.WATCHED:
+            if name in self.__dict__ and self.__dict__[name] == value:
+                return
+            object.__setattr__(self, name, value)
+            self.notify(name)
+        else:
+            object.__setattr__(self, name, value)
+
+    def notify(self, name: str) -> None:
+        self.version += 1
+        if self.subscribers:
+            for callback in self.subscribers.get(name, ()):
+                callback()
+
+    def subscribe(self, names: tuple, callback) -> None:
+        """
+        names中任一属性改变时调用callback。
+        """
+        if self.subscribers is None:
+            self.subscribers = {}
+        for name in names:
+            self.subscribers.setdefault(name, []).append(callback)
+
+
+class TextCache:
+    """
+    文字渲染结果的LRU缓存。
+    """
+
+    def __init__(self, capacity: int = TEXT_CACHE_SIZE) -> None:
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> pygame.Surface:
+        surface = self.surfaces.get(key)
+        if surface is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def put(self, key: tuple, surface: pygame.Surface) -> None:
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
 
+    def clear(self) -> None:
+        self.surfaces.clear()
 
-def askcolor(default, title):
-    tk = tkinter.Tk()
-    tk.withdraw()
-    color = tkinter.colorchooser.askcolor(default, title=title)[1]
-    tk.destroy()
-    return color
 
+class GlyphAtlas:
+    """
+    预先栅格化的字形图集，按字体哈希和字号缓存在磁盘上。
+    FreeType渲染的文字颜色均匀、只有透明度不同，所以图集只保存透明度，拼接时再填充颜色；
+    只有图集中没有的字符才交给FreeType渲染。
+    """
+    WIDTH = 1024
 
-class Window:
-    def __init__(self, cp: ConfigParser) -> None:
-        pygame.init()
-        self.screen = pygame.display.set_mode(WINDOW_SIZE)
-        pygame.display.set_caption(WINDOW_TITLE)
-        self.fonts = [[pygame.font.Font(os.path.join(
-            RESOURCES, m), 18+i*8) for i in range(4)] for m in ('FZFWQingYinTiJWL.ttf', 'CascadiaCode.ttf')]
+    def __init__(self, window, font: int, size: int, directory: str = GLYPH_CACHE_DIR) -> None:
+        self.window = window
+        self.font = font
+        self.size = size
+        self.glyphs = {}
+        self.sheet = None
+        self.height = 0
+        self.ascent = 0
+        self.x = self.y = self.row = 0
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        name = f'{window.font_hash(font)[:16]}-{font_size(size)}'
+        self.path = os.path.join(directory, name)
+        # 用户缓存中没有时先用随程序发布的图集，都没有时从空图集开始，用到的字符再渲染
+        if not self.load(self.path) and not (directory == GLYPH_CACHE_DIR and self.load(
+                os.path.join(RESOURCES, GLYPH_BUNDLE_DIR, name))):
+            self.height = window.get_font(font, size).get_height()
+            self.ascent = window.get_font(font, size).get_ascent()
+            self.sheet = np.zeros((self.height*8, self.WIDTH), np.uint8)
+
+    def load(self, path: str) -> bool:
+        """
+        从磁盘读取图集，文件缺失或与当前环境不符时返回False。
+        """
+        try:
+            with open(path+'.json', encoding='utf-8') as f:
+                meta = json.load(f)
+            assert(meta['ttf'] == list(pygame.font.get_sdl_ttf_version()))
+            with open(path+'.bin', 'rb') as f:
+                sheet = np.frombuffer(zlib.decompress(
+                    f.read()), np.uint8).reshape(-1, self.WIDTH)
+            glyphs = {ch: tuple(g) for ch, g in meta['glyphs'].items()}
+            assert(all(x+w <= self.WIDTH and y+h <= sheet.shape[0]
+                       for x, y, w, h, fits, blank in glyphs.values()))
+            ascent = meta['ascent']
+        except:
+            return False
+        self.height = meta['height']
+        self.ascent = ascent
+        self.glyphs = glyphs
+        self.x, self.y, self.row = meta['cursor']
+        self.sheet = np.zeros(
+            (max(sheet.shape[0], self.height*8), self.WIDTH), np.uint8)
+        self.sheet[:sheet.shape[0]] = sheet
+        return True
+
+    def save(self) -> None:
+        """
+        把图集写回磁盘（只保存已使用的行）。
+        """
+        if not self.dirty:
+            return
+        meta = {'ttf': list(pygame.font.get_sdl_ttf_version()), 'height': self.height,
+                'ascent': self.ascent,
+                'cursor': [self.x, self.y, self.row], 'glyphs': self.glyphs}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path+'.bin.tmp', 'wb') as f:
+                f.write(zlib.compress(self.sheet[:self.y+self.row].tobytes()))
+            with open(self.path+'.json.tmp', 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(self.path+'.bin.tmp', self.path+'.bin')
+            os.replace(self.path+'.json.tmp', self.path+'.json')
+        except OSError:
+            return
+        self.dirty = False
+
+    def add(self, chars) -> None:
+        """
+        用FreeType渲染新字符并放入图集。
+        """
+        font = self.window.get_font(self.font, self.size)
+        for ch in chars:
+            if ch in self.glyphs:
+                continue
+            glyph = counted(font.render(ch, True, (255, 255, 255)))
+            w, h = glyph.get_size()
+            minx, maxx, miny, maxy, advance = font.metrics(ch)[0]
+            # 伸出步进宽度之外的字形会和相邻字符重叠，不能直接拼接
+            fits = int(minx >= 0 and maxx <= advance == w)
+            alpha = pygame.surfarray.array_alpha(glyph).T
+            # 字体中没有的字符渲染出来是空白
+            blank = int(not ch.isspace() and not alpha.any())
+            if self.x+w > self.WIDTH:
+                self.x = 0
+                self.y += self.row
+                self.row = 0
+            self.row = max(self.row, h)
+            if self.y+self.row > self.sheet.shape[0]:
+                self.sheet = np.vstack((self.sheet, np.zeros_like(self.sheet)))
+            self.sheet[self.y:self.y+h, self.x:self.x+w] = alpha
+            self.glyphs[ch] = (self.x, self.y, w, h, fits, blank)
+            self.x += w
+            self.dirty = True
+
+    def blank(self, ch: str) -> bool:
+        """
+        判断字体中是否缺少这个字符。
+        """
+        if ch not in self.glyphs:
+            self.add(ch)
+        return bool(self.glyphs[ch][5])
+
+    def render(self, text: str, color: tuple) -> pygame.Surface:
+        """
+        从图集拼接出一行文字。
+        """
+        missing = set(text).difference(self.glyphs)
+        if missing:
+            self.misses += 1
+            self.add(sorted(missing))
+        else:
+            self.hits += 1
+        glyphs = [self.glyphs[ch] for ch in text]
+        if not all(g[4] for g in glyphs):
+            return counted(self.window.get_font(self.font, self.size).render(text, True, color))
+        # 有下伸部分的字形比行高略高，整行高度取其中最高的字形，字形顶端对齐
+        height = max([self.height]+[g[3] for g in glyphs])
+        line = np.zeros((height, sum(g[2] for g in glyphs)), np.uint8)
+        left = 0
+        for x, y, w, h, fits, blank in glyphs:
+            line[:h, left:left+w] = self.sheet[y:y+h, x:x+w]
+            left += w
+        surface = counted(pygame.Surface(line.shape[::-1], pygame.SRCALPHA))
+        surface.fill(tuple(color)+(0,))
+        alpha = pygame.surfarray.pixels_alpha(surface)
+        alpha[:] = line.T
+        del alpha
+        return surface
+
+
+class Assets:
+    """
+    图标资源的统一存放处：每个(名称, 尺寸)只从磁盘加载一次，转换为显示格式后共享。
+    """
+
+    def __init__(self) -> None:
+        self.images = {}
+        self.loads = 0
+
+    def icon(self, name: str, size: tuple = None) -> pygame.Surface:
+        """
+        获取缩放到指定尺寸的图标（必须在创建窗口之后调用）。
+        """
+        key = (name, tuple(size) if size else None)
+        if key not in self.images:
+            image = pygame.image.load(
+                os.path.join(RESOURCES, 'icons', name+'.png'))
+            self.loads += 1
+            if size:
+                image = counted(pygame.transform.scale(image, size))
+            self.images[key] = counted(image.convert_alpha(), 2)
+        return self.images[key]
+
+    def clear(self) -> None:
+        self.images.clear()
+
+    def memory(self) -> int:
+        return sum(image.get_pitch()*image.get_height() for image in self.images.values())
+
+    def report(self) -> str:
+        lines = ['资源占用:']
+        for (name, size), image in sorted(self.images.items(), key=lambda item: str(item[0])):
+            w, h = image.get_size()
+            lines.append(
+                f'  {name:<10}{w:>4}x{h:<4}{image.get_pitch()*h/1024:8.1f} KB')
+        lines.append(
+            f'  {"total":<19}{self.memory()/1024:8.1f} KB ({self.loads} loads)')
+        return '\n'.join(lines)
+
+
+class Profiler:
+    """
+    逐帧记录各阶段耗时以及缓存命中、Surface创建和配置写入次数，可显示为浮层或导出。
+    """
+
+    def __init__(self, window) -> None:
+        self.window = window
+        self.visible = False
+        # 每行：帧开始时刻、各阶段耗时（秒）、各计数器本帧的增量
+        self.history = np.zeros(
+            (PROFILE_HISTORY, 1+len(PROFILE_PHASES)+len(PROFILE_COUNTERS)))
+        self.current = np.zeros(self.history.shape[1])
+        self.count = 0
+        self.start = None
+        self.last = 0.0
+        self.counters = self.read_counters()
+        # 用--profile指定文件时记录全部帧，退出时保存
+        self.path = None
+        self.frames = []
+        # 浮层在第一次显示时才创建
+        self.font = None
+        self.overlay = None
+        self.built = 0.0
+
+    def read_counters(self) -> tuple:
+        window = self.window
+        atlases = window.atlases.values()
+        return (window.text_cache.hits, window.text_cache.misses,
+                sum(atlas.hits for atlas in atlases), sum(
+                    atlas.misses for atlas in atlases),
+                surface_count, window.cp.writes)
+
+    def record(self, path: str) -> None:
+        self.path = path
+
+    def begin(self) -> None:
+        """
+        开始新的一帧（不计入等待事件的时间）。
+        """
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, phase: str) -> None:
+        """
+        把上次记录以来的时间计入phase阶段。
+        """
+        if self.start is None:
+            return
+        now = time.perf_counter()
+        self.current[1+PROFILE_PHASES.index(phase)] += now-self.last
+        self.last = now
+
+    def end(self) -> None:
+        """
+        结束当前帧，写入历史记录。
+        """
+        if self.start is None:
+            return
+        counters = self.read_counters()
+        self.current[0] = self.start-START_TIME
+        self.current[1+len(PROFILE_PHASES):] = np.subtract(
+            counters, self.counters)
+        self.counters = counters
+        self.history[self.count % PROFILE_HISTORY] = self.current
+        if self.path:
+            self.frames.append(self.current.copy())
+        self.count += 1
+        self.current[:] = 0
+        self.start = None
+
+    def recent(self) -> np.ndarray:
+        """
+        按时间顺序返回浮层保留的各帧。
+        """
+        n = min(self.count, PROFILE_HISTORY)
+        return self.history[np.arange(self.count-n, self.count) % PROFILE_HISTORY]
+
+    def process_key_event(self, key: int) -> None:
+        if key == pygame.K_F3:
+            self.visible = not self.visible
+            self.built = 0.0
+            self.window.damage_all()
+        elif key == pygame.K_F4:
+            path = f'profile-{time.strftime("%Y%m%d-%H%M%S")}.{self.window.trace_format}'
+            try:
+                self.export(path, self.recent())
+            except OSError:
+                self.window.error('性能记录导出失败!')
+                return
+            self.window.message(
+                f'已导出最近{min(self.count, PROFILE_HISTORY)}帧的性能记录到{path}', '性能记录')
+
+    def export(self, path: str, frames: np.ndarray) -> None:
+        """
+        导出各帧记录：.json为Chrome trace格式（可在chrome://tracing或Perfetto中打开），其他为CSV。
+        """
+        phases = len(PROFILE_PHASES)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            if path.endswith('.json'):
+                events = []
+                for frame in frames:
+                    ts = frame[0]*1e6
+                    events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1,
+                                   'ts': round(ts, 1), 'dur': round(frame[1:1+phases].sum()*1e6, 1)})
+                    for name, t in zip(PROFILE_PHASES, frame[1:1+phases]):
+                        if t:
+                            events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                                           'ts': round(ts, 1), 'dur': round(t*1e6, 1)})
+                            ts += t*1e6
+                    events.append({'name': 'counters', 'ph': 'C', 'pid': 1, 'ts': round(frame[0]*1e6, 1),
+                                   'args': dict(zip(PROFILE_COUNTERS, frame[1+phases:].astype(int).tolist()))})
+                json.dump({'traceEvents': events,
+                           'displayTimeUnit': 'ms'}, f)
+            else:
+                f.write(','.join(['frame', 'time_ms']+[f'{name}_ms' for name in PROFILE_PHASES]
+                                 + ['total_ms']+list(PROFILE_COUNTERS))+'\n')
+                for i, frame in enumerate(frames):
+                    f.write(','.join([str(i), f'{frame[0]*1000:.3f}']
+                                     + [f'{t*1000:.3f}' for t in frame[1:1+phases]]
+                                     + [f'{frame[1:1+phases].sum()*1000:.3f}']
+                                     + [str(int(n)) for n in frame[1+phases:]])+'\n')
+
+    def close(self) -> None:
+        """
+        退出时保存--profile记录的全部帧。
+        """
+        if self.path and self.frames:
+            try:
+                self.export(self.path, np.array(self.frames))
+            except OSError as e:
+                print(f'性能记录保存失败: {e}', file=sys.stderr)
+
+    def build(self) -> None:
+        """
+        重新生成浮层：最近一秒的平均值和最近各帧的分阶段耗时图。
+        """
+        self.overlay.fill((16, 16, 16))
+        frames = self.recent()
+        phases = len(PROFILE_PHASES)
+        second = frames[frames[:, 0] > frames[-1, 0]-1] if len(frames) else frames
+        fps = (len(second)-1)/(second[-1, 0]-second[0, 0]
+                               ) if len(second) > 1 else 0
+        mean = second[:, 1:1+phases].mean(0) if len(
+            second) else np.zeros(phases)
+        total = second[:, 1+phases:].sum(0).astype(int) if len(
+            second) else np.zeros(len(PROFILE_COUNTERS), int)
+        lines = [(f'FPS {fps:5.1f}   frame {mean.sum()*1000:6.2f} ms', (255, 255, 255))]
+        lines += [(f'   {name:<13}{t*1000:6.2f} ms', color)
+                  for name, t, color in zip(PROFILE_PHASES, mean, PROFILE_COLORS)]
+        lines.append((f'text cache {total[0]}/{total[1]}  glyphs {total[2]}/{total[3]}',
+                      (200, 200, 200)))
+        lines.append((f'surfaces {total[4]}  config writes {total[5]}  (per s)',
+                      (200, 200, 200)))
+        for i, (text, color) in enumerate(lines):
+            self.overlay.blit(counted(self.font.render(
+                text, True, color)), (6, 4+i*15))
+            if 1 <= i <= phases:
+                self.overlay.fill(color, (8, 8+i*15, 8, 8))
+        # 耗时图：每列一帧，各阶段自下而上堆叠，60像素对应两帧(1/30秒)，横线为1/60秒
+        graph = self.overlay.subsurface((6, 158, 258, 60))
+        width, height = graph.get_size()
+        if len(frames):
+            frames = frames[-width:]
+            tops = np.cumsum(frames[:, 1:1+phases], 1)*height*30
+            rows = np.arange(height)[::-1]
+            index = (rows[None, :, None] >= tops[:, None, :]).sum(-1)
+            colors = np.array(PROFILE_COLORS+((40, 40, 40),), np.uint8)
+            pixels = np.full((width, height, 3), 40, np.uint8)
+            pixels[width-len(frames):] = colors[index]
+            pygame.surfarray.blit_array(graph, pixels)
+        pygame.draw.line(graph, (255, 255, 255), (0, height//2),
+                         (width, height//2))
+
+    def draw(self) -> None:
+        """
+        绘制浮层（浮层本身的耗时不计入各阶段）。
+        """
+        if not self.visible:
+            return
+        if not self.overlay:
+            self.font = pygame.font.Font(
+                io.BytesIO(self.window.read_font(1)), 12)
+            self.overlay = counted(pygame.Surface((270, 222)).convert(), 2)
+            self.overlay.set_alpha(220)
+        if self.window.now-self.built > 0.25:
+            self.build()
+            self.built = self.window.now
+        self.window.mark(self.window.screen.blit(self.overlay, (8, 8)))
+        self.last = time.perf_counter()
+
+
+class Recorder:
+    """
+    在后台把动画帧保存为PNG序列或GIF：主线程只复制画面放入有界队列，编码和写文件由工作线程完成。
+    GIF的每一帧编码后立即按顺序追加到文件，内存中只保留少量尚未轮到写入的帧。
+    """
+
+    def __init__(self, path: str, gif: bool = False, workers: int = None) -> None:
+        if gif:
+            # Pillow是可选依赖，只在录制GIF时需要
+            from PIL import Image
+            self.image = Image
+            self.file = open(path, 'wb')
+        else:
+            os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.gif = gif
+        self.count = 0
+        self.size = None
+        self.error = None
+        # 编码好但前面还有帧没写入的GIF帧
+        self.pending = {}
+        self.written = 0
+        self.lock = threading.Lock()
+        # 队列满时put会等待，积压的帧不会无限占用内存
+        self.queue = queue.Queue(RECORD_QUEUE)
+        # 主循环出错退出时不等待工作线程，正常退出由Window.quit等待录制完成
+        self.workers = [threading.Thread(target=self.work, daemon=True)
+                        for i in range(workers or min(4, os.cpu_count() or 1))]
+        for worker in self.workers:
+            worker.start()
+        self.finisher = None
+
+    def put(self, surface: pygame.Surface) -> None:
+        """
+        放入一帧画面；录制出错后不再接收，队列满时等待，但工作线程都已退出时放弃这一帧，不会卡住界面。
+        """
+        if self.error:
+            return
+        if self.size is None:
+            self.size = surface.get_size()
+        elif surface.get_size() != self.size:
+            # GIF的尺寸由第一帧决定
+            return
+        item = (self.count, counted(surface.copy()))
+        while any(worker.is_alive() for worker in self.workers):
+            try:
+                self.queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            self.count += 1
+            return
+        self.error = RuntimeError('录制线程已退出')
+
+    def work(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            index, surface = item
+            frame = b''
+            try:
+                if self.gif:
+                    frame = self.encode(index, surface)
+                else:
+                    save_png(surface, os.path.join(
+                        self.path, f'frame_{index:05d}.png'))
+            except Exception as e:
+                self.error = e
+            if self.gif:
+                # 出错的帧也要占住序号，后面的帧才能继续写入
+                self.write(index, frame)
+
+    def encode(self, index: int, surface: pygame.Surface) -> bytes:
+        """
+        用Pillow把一帧编码为单帧GIF，再取出其中的调色板和图像数据，组成动画中的一帧。
+        """
+        data = io.BytesIO()
+        self.image.frombytes('RGB', surface.get_size(), pygame.image.tobytes(
+            surface, 'RGB')).quantize().save(data, 'GIF', interlace=False)
+        data = data.getvalue()
+        # 逻辑屏幕描述符之后是全局调色板，作为这一帧的局部调色板
+        flags = data[10]
+        table = data[13:13+3*2**((flags & 7)+1)] if flags & 0x80 else b''
+        i = 13+len(table)
+        while data[i] == 0x21:
+            # 跳过扩展块
+            i += 2
+            while data[i]:
+                i += data[i]+1
+            i += 1
+        # 图像描述符：位置、尺寸和标志位，然后是LZW最小码长和数据子块
+        descriptor, flags2 = data[i:i+9], data[i+9]
+        if flags2 & 0x80:
+            table = data[i+10:i+10+3*2**((flags2 & 7)+1)]
+            flags = flags2
+        i += 10+(len(table) if flags2 & 0x80 else 0)
+        end = i+1
+        while data[end]:
+            end += data[end]+1
+        # GIF的帧间隔以1/100秒为单位，逐帧累计取整（每秒30帧时为3、3、4……），总时长与录制的一致
+        delay = (index+1)*100//SWEEP_RATE-index*100//SWEEP_RATE
+        return (b'\x21\xf9\x04\x00'+delay.to_bytes(2, 'little')+b'\x00\x00'
+                + descriptor+bytes((0x80 | flags2 & 0x40 | flags & 7,))+table+data[i:end+1])
+
+    def write(self, index: int, frame: bytes) -> None:
+        """
+        按帧序号顺序写入GIF文件（第一帧之前写文件头）。
+        """
+        with self.lock:
+            self.pending[index] = frame
+            while self.written in self.pending:
+                frame = self.pending.pop(self.written)
+                self.written += 1
+                if self.error:
+                    # 出错的录制最后会被删除，剩下的帧不必再写
+                    continue
+                try:
+                    if self.written == 1:
+                        w, h = self.size
+                        self.file.write(b'GIF89a'+w.to_bytes(2, 'little')+h.to_bytes(2, 'little')+b'\x00\x00\x00'
+                                        + b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+                    self.file.write(frame)
+                except OSError as e:
+                    self.error = e
+
+    def close(self) -> None:
+        """
+        结束录制：在后台等待剩余的帧处理完，完成后发送RECORD_DONE事件。
+        """
+        self.finisher = threading.Thread(target=self.finish, daemon=True)
+        self.finisher.start()
+
+    def wait(self) -> None:
+        """
+        等待录制的帧全部写完。
+        """
+        if self.finisher:
+            self.finisher.join()
+
+    def finish(self) -> None:
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        if self.gif:
+            try:
+                self.file.write(b'\x3b')
+                self.file.close()
+                if not self.count or self.error:
+                    os.remove(self.path)
+            except Exception as e:
+                self.error = self.error or e
+        if pygame.display.get_init():
+            pygame.event.post(pygame.event.Event(RECORD_DONE, recorder=self, path=self.path, frames=self.count,
+                                                 error=str(self.error) if self.error else ''))
+
+
+class Window(Observable):
+    # 主题和背景设置
+    WATCHED = ('main_color', 'grid_color', 'axis_color', 'grid_alpha',
+               'axis_alpha', 'mask_alpha', 'bg_mode', 'background', 'size', 'ui_scale')
+
+    def __init__(self, cp: Config) -> None:
+        # 只初始化用到的显示和字体模块
+        pygame.display.init()
+        pygame.font.init()
+        detect_display_scale()
+        self.fonts = {}
+        self.font_data = {}
+        self.font_hashes = {}
+        self.atlases = {}
+        self.text_cache = TextCache()
+        self.assets = Assets()
         self.mouse_pos = (0, 0)
         self.cp = cp
 
         if not self.cp.has_section('window'):
             self.cp.add_section('window')
 
+        # 恢复上次的窗口尺寸
+        try:
+            size = tuple(map(int, self.get_or_set(
+                'size', '%dx%d' % MIN_WINDOW_SIZE).split('x')))
+            assert(len(size) == 2)
+        except:
+            size = MIN_WINDOW_SIZE
+            self.cp.set('window', 'size', '%dx%d' % MIN_WINDOW_SIZE)
+        self.size = set_window_size(size)
+        self.ui_scale = UI_SCALE
+        self.screen = pygame.display.set_mode(self.size, pygame.RESIZABLE)
+        pygame.display.set_caption(WINDOW_TITLE)
+        # 等待执行的尺寸调整：(新尺寸, 最后一次收到调整事件的时刻)
+        self.resize_to = None
+
+        # 设置背景图片蒙版不透明度
+        try:
+            self.mask_alpha = int(self.get_or_set('mask_alpha', '200'))
+            assert(0 <= self.mask_alpha <= 255)
+        except:
+            self.mask_alpha = 200
+            self.cp.set('window', 'mask_alpha', '200')
+
         # 设置窗口背景
+        self.bg_token = 0
+        self.bg_loaded = None
         self.background = self.get_or_set('background', '#000000')
         if self.background.startswith('#'):
             self.apply_bg_mode('color')
@@ -100,7 +1137,57 @@ class Window:
             self.axis_alpha = 255
             self.cp.set('window', 'axis_alpha', '255')
 
-        self.cp.write(open('config.ini', 'w', encoding='utf-8'))
+        # 设置帧率上限
+        try:
+            self.max_fps = int(self.get_or_set('max_fps', '60'))
+            assert(self.max_fps > 0)
+        except:
+            self.max_fps = 60
+            self.cp.set('window', 'max_fps', '60')
+
+        # 设置空闲策略（wait:画面静止时休眠等待事件，tick:始终按帧率上限刷新）
+        self.idle = self.get_or_set('idle', 'wait')
+        if self.idle not in ('wait', 'tick'):
+            self.idle = 'wait'
+            self.cp.set('window', 'idle', 'wait')
+
+        # 设置画面提交方式（rects:只提交变化区域，flip:整屏提交）
+        self.present = self.get_or_set('present', 'rects')
+        if self.present not in ('rects', 'flip'):
+            self.present = 'rects'
+            self.cp.set('window', 'present', 'rects')
+
+        # 设置性能记录的导出格式（csv或json，json为Chrome trace格式）
+        self.trace_format = self.get_or_set('trace_format', 'csv')
+        if self.trace_format not in ('csv', 'json'):
+            self.trace_format = 'csv'
+            self.cp.set('window', 'trace_format', 'csv')
+
+        self.clock = pygame.time.Clock()
+        self.redraw = True
+        self.now = time.time()
+        self.tweens = set()
+        # 正在播放的参数动画
+        self.sweep = None
+        # 停止录制后还在后台写文件的录制器
+        self.recorders = []
+        self.damaged = []
+        self.last_damaged = []
+        self.full_damage = True
+        # 窗口内对话框（栈顶的对话框接收所有输入）
+        self.dialogs = []
+        self.bg_image = None
+        self.apply_size()
+        self.profiler = Profiler(self)
+        # 颜色改变后原来缓存的文字都不会再用到
+        self.subscribe(('main_color', 'grid_color', 'axis_color'),
+                       self.text_cache.clear)
+        self.subscribe(('mask_alpha',),
+                       lambda: self.mask.set_alpha(self.mask_alpha))
+        self.subscribe(('size',), self.apply_size)
+        self.subscribe(('ui_scale',), self.apply_ui_scale)
+
+        self.cp.save()
 
     def get_or_set(self, key: str, default: str) -> str:
         if self.cp.has_option('window', key):
@@ -109,11 +1196,61 @@ class Window:
             self.cp.set('window', key, default)
             return default
 
+    def apply_size(self) -> None:
+        """
+        按窗口尺寸生成整窗大小的图层，背景图片从原图重新缩放。
+        """
+        # 蒙版在合成时叠加，调整不透明度不需要重新生成背景
+        self.mask = counted(pygame.Surface(self.size).convert(), 2)
+        self.mask.fill((0, 0, 0))
+        self.mask.set_alpha(self.mask_alpha)
+        self.shade = counted(pygame.Surface(self.size).convert(), 2)
+        self.shade.fill((0, 0, 0))
+        self.shade.set_alpha(120)
+        if self.bg_image and self.bg_image.get_size() != self.size:
+            self.load_bg_image(self.background)
+        for dialog in self.dialogs:
+            dialog.recenter()
+        if self.sweep and self.sweep.recorder:
+            # 录制的帧尺寸必须一致，窗口尺寸改变时结束录制（已录下的部分照常保存）
+            self.sweep.stop()
+        self.damage_all()
+
+    def apply_ui_scale(self) -> None:
+        """
+        界面缩放改变后丢弃按原来字号和尺寸生成的字体、字形图集、文字和图标，用到时按新的缩放重新生成。
+        """
+        self.save_atlases()
+        self.fonts.clear()
+        self.atlases.clear()
+        self.text_cache.clear()
+        self.assets.clear()
+
+    def resize(self, size: tuple) -> None:
+        """
+        按新的窗口尺寸重新排版，各图层通过ui_scale和size的订阅者重新生成。
+        """
+        self.resize_to = None
+        size = set_window_size(size)
+        if pygame.display.get_surface().get_size() != size:
+            # 小于最小尺寸时恢复到最小尺寸
+            self.screen = pygame.display.set_mode(size, pygame.RESIZABLE)
+        else:
+            self.screen = pygame.display.get_surface()
+        # 先更新界面缩放，控件重新创建后再按新尺寸排版
+        self.ui_scale = UI_SCALE
+        self.size = size
+        self.cp.set('window', 'size', '%dx%d' % size)
+        self.cp.save()
+        self.damage_all()
+
     def apply_bg_mode(self, mode: str) -> None:
         """
         应用背景模式。
         """
         if mode == 'color':
+            # 作废还在加载的背景图片，避免加载完成后覆盖新选的颜色
+            self.bg_token += 1
             self.bg_mode = 'color'
             try:
                 self.bg_color = tuple(int(self.background[i:i+2], 16)
@@ -123,26 +1260,65 @@ class Window:
                 self.bg_color = (0, 0, 0)
                 self.cp.set('window', 'background', '#000000')
         elif mode == 'image':
+            # 图片加载完成前以纯黑背景占位
+            self.bg_mode = 'image'
+            self.bg_image = None
+            self.bg_color = (0, 0, 0)
+            self.load_bg_image(self.background)
+
+    def load_bg_image(self, path: str, notify: bool = False) -> None:
+        """
+        在后台线程中加载并缩放背景图片，完成后通知主循环。
+        """
+        self.bg_token += 1
+        token = self.bg_token
+
+        def work():
             try:
-                self.bg_image = pygame.transform.scale(
-                    pygame.image.load(self.background), WINDOW_SIZE)
-                self.bg_image_with_mask = self.bg_image.copy()
-                self.bg_color = (0, 0, 0)
-                self.bg_mode = 'image'
-                try:
-                    self.mask_alpha = int(self.get_or_set('mask_alpha', '200'))
-                    assert(0 <= self.mask_alpha <= 255)
-                except:
-                    self.mask_alpha = 200
-                    self.cp.set('window', 'mask_alpha', '200')
-                mask = pygame.Surface(WINDOW_SIZE, pygame.SRCALPHA)
-                mask.fill((0, 0, 0, self.mask_alpha))
-                self.bg_image_with_mask.blit(mask, (0, 0))
+                image = pygame.image.load(path)
+                if image.get_bitsize() in (24, 32):
+                    image = pygame.transform.smoothscale(image, WINDOW_SIZE)
+                else:
+                    image = pygame.transform.scale(image, WINDOW_SIZE)
+                counted(image, 2)
             except:
-                self.bg_mode = 'color'
+                image = None
+            if token == self.bg_token:
+                self.bg_loaded = (token, path, image, notify)
+                pygame.event.post(pygame.event.Event(BG_LOADED))
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def finish_bg_image(self) -> None:
+        """
+        在主线程中启用加载完成的背景图片。
+        """
+        if not self.bg_loaded or self.bg_loaded[0] != self.bg_token:
+            return
+        token, path, image, notify = self.bg_loaded
+        self.bg_loaded = None
+        if image is None:
+            if notify:
+                self.error('无法加载所选的背景图片，请重新选择。',
+                           then=self.set_bg_image)
+            else:
                 self.background = '#000000'
-                self.bg_color = (0, 0, 0)
+                self.apply_bg_mode('color')
                 self.cp.set('window', 'background', '#000000')
+                self.cp.save()
+                self.damage_all()
+            return
+        if image.get_size() != self.size:
+            # 加载期间窗口尺寸改变了，按新尺寸重新缩放
+            self.load_bg_image(path, notify)
+            return
+        self.bg_image = counted(image.convert())
+        self.background = path
+        self.bg_mode = 'image'
+        self.bg_color = (0, 0, 0)
+        self.cp.set('window', 'background', path)
+        self.cp.save()
+        self.damage_all()
 
     def change_bg_mode(self) -> None:
         """
@@ -160,91 +1336,322 @@ class Window:
         """
         设置背景颜色。
         """
-        color = askcolor(self.bg_color, '选择背景颜色')
-        if color:
+        def accept(color):
             self.background = color
             self.apply_bg_mode('color')
+            self.damage_all()
             self.cp.set('window', 'background', color)
-            self.cp.write(open('config.ini', 'w', encoding='utf-8'))
+            self.cp.save()
+        self.ask_color(self.bg_color, '选择背景颜色', accept)
 
     def set_bg_image(self) -> None:
         """
         设置背景图片。
         """
-        image = easygui.fileopenbox('选择背景图片')
+        image = fileopenbox('选择背景图片')
         if image:
-            try:
-                pygame.image.load(image)
-                self.background = image
-                self.apply_bg_mode('image')
-                self.cp.set('window', 'background', image)
-                self.cp.write(open('config.ini', 'w', encoding='utf-8'))
-            except:
-                self.error('无法加载所选的背景图片，请重新选择。')
-                self.set_bg_image()
+            self.load_bg_image(image, True)
 
     def set_main_color(self) -> None:
         """
         设置主题颜色。
         """
-        color = askcolor(self.main_color_hex, '选择主题颜色')
-        if color:
-            self.main_color_hex = color
-            self.main_color = [int(color[i:i+2], 16)
-                               for i in range(1, 7, 2)]
-            self.cp.set('window', 'main_color', color)
-            self.cp.write(open('config.ini', 'w', encoding='utf-8'))
+        self.ask_color(self.main_color_hex, '选择主题颜色',
+                       self.apply_main_color)
+
+    def apply_main_color(self, color: str) -> None:
+        self.main_color_hex = color
+        self.main_color = [int(color[i:i+2], 16)
+                           for i in range(1, 7, 2)]
+        self.damage_all()
+        self.cp.set('window', 'main_color', color)
+        self.cp.save()
 
     def set_mask_alpha(self, value: float) -> None:
         """
         设置蒙版不透明度（参数为小数）。
         """
+        if int(value * 255) == self.mask_alpha:
+            return
         self.mask_alpha = int(value * 255)
+        self.damage_all()
         self.cp.set('window', 'mask_alpha', str(self.mask_alpha))
-        self.cp.write(open('config.ini', 'w', encoding='utf-8'))
-        self.bg_image_with_mask = self.bg_image.copy()
-        mask = pygame.Surface(WINDOW_SIZE, pygame.SRCALPHA)
-        mask.fill((0, 0, 0, self.mask_alpha))
-        self.bg_image_with_mask.blit(mask, (0, 0))
+        self.cp.save()
+
+    def invalidate(self) -> None:
+        """
+        标记画面需要重绘。
+        """
+        self.redraw = True
+
+    def tick(self) -> None:
+        """
+        更新帧时钟，同一帧内的动画都使用这个时刻。
+        """
+        self.now = time.time()
+
+    def mark(self, rect: pygame.Rect) -> pygame.Rect:
+        """
+        记录本帧被修改的区域。
+        """
+        self.damaged.append(rect)
+        return rect
+
+    def mark_changed(self, widget, state: tuple, rects: list) -> None:
+        """
+        控件的绘制状态（内容、位置、透明度等）与上一帧不同时，才记录它上一帧和本帧占用的区域。
+        """
+        if widget.shown and widget.shown[0] == state:
+            return
+        if widget.shown:
+            self.damaged += widget.shown[1]
+        self.damaged += rects
+        widget.shown = (state, rects)
+
+    def damage_all(self) -> None:
+        """
+        标记本帧需要整屏提交。
+        """
+        self.full_damage = True
+        self.invalidate()
+
+    def need_redraw(self) -> bool:
+        """
+        判断画面是否需要重绘。
+        """
+        return self.redraw or bool(self.tweens) or bool(self.resize_to)
 
     def draw_frame(self) -> None:
         """
         绘制窗口框架。
         """
+        self.tick()
+        self.redraw = False
         if self.bg_mode == 'color':
             self.screen.fill(self.bg_color)
         elif self.bg_mode == 'image':
-            self.screen.blit(self.bg_image_with_mask, (0, 0))
+            if self.bg_image:
+                if self.bg_image.get_size() != self.screen.get_size():
+                    # 改变窗口大小后，重新缩放的背景图片加载完成前先用底色填充空出的部分
+                    self.screen.fill(self.bg_color)
+                self.screen.blit(self.bg_image, (0, 0))
+                self.screen.blit(self.mask, (0, 0))
+            else:
+                self.screen.fill(self.bg_color)
         pygame.draw.line(self.screen, self.main_color,
-                         (SIDEBAR_LEFT, 0), (SIDEBAR_LEFT, 600), 3)
+                         (SIDEBAR_LEFT, 0), (SIDEBAR_LEFT, WINDOW_SIZE[1]), 3)
+
+    def read_font(self, font: int) -> bytes:
+        """
+        读取字体文件，同一字体文件只从磁盘读取一次。
+        """
+        name = FONT_FILES[font]
+        if name not in self.font_data:
+            with open(os.path.join(RESOURCES, name), 'rb') as f:
+                self.font_data[name] = f.read()
+        return self.font_data[name]
+
+    def font_hash(self, font: int) -> str:
+        """
+        计算字体文件的哈希；结果按文件大小和修改时间记录在缓存目录中，文件不变时不必重新读取。
+        """
+        if font not in self.font_hashes:
+            name = FONT_FILES[font]
+            stat = os.stat(os.path.join(RESOURCES, name))
+            stamp = [stat.st_size, stat.st_mtime_ns]
+            index_path = os.path.join(GLYPH_CACHE_DIR, 'fonts.json')
+            try:
+                with open(index_path, encoding='utf-8') as f:
+                    index = json.load(f)
+            except:
+                index = {}
+            if index.get(name, {}).get('stamp') != stamp:
+                index[name] = {'stamp': stamp, 'sha1': hashlib.sha1(
+                    self.read_font(font)).hexdigest()}
+                try:
+                    os.makedirs(GLYPH_CACHE_DIR, exist_ok=True)
+                    with open(index_path, 'w', encoding='utf-8') as f:
+                        json.dump(index, f)
+                except OSError:
+                    pass
+            self.font_hashes[font] = index[name]['sha1']
+        return self.font_hashes[font]
+
+    def get_font(self, font: int, size: int) -> pygame.font.Font:
+        """
+        获取字体，第一次使用时才创建。
+        """
+        if (font, size) not in self.fonts:
+            self.fonts[font, size] = pygame.font.Font(
+                io.BytesIO(self.read_font(font)), font_size(size))
+        return self.fonts[font, size]
+
+    def get_atlas(self, size: int) -> GlyphAtlas:
+        """
+        获取中文界面字体的字形图集。
+        """
+        if size not in self.atlases:
+            self.atlases[size] = GlyphAtlas(self, 0, size)
+        return self.atlases[size]
+
+    def save_atlases(self) -> None:
+        for atlas in self.atlases.values():
+            atlas.save()
+
+    def render_text(self, text: str, size: int = 1, font: int = 0, color: tuple = None, antialias: bool = True, background: tuple = None) -> pygame.Surface:
+        """
+        渲染文字（结果会被缓存）。
+        """
+        color = tuple(color if color else self.main_color)
+        key = (text, font, size, color, antialias,
+               tuple(background) if background else None)
+        render = self.text_cache.get(key)
+        if render is None:
+            if font == 0 and antialias:
+                # 中文界面字体从字形图集拼接
+                render = self.get_atlas(size).render(text, color)
+                if background:
+                    text_render = render
+                    render = counted(pygame.Surface(text_render.get_size()))
+                    render.fill(background)
+                    render.blit(text_render, (0, 0))
+            else:
+                render = counted(self.get_font(font, size).render(
+                    text, antialias, color, background))
+            self.text_cache.put(key, render)
+        return render
+
+    def rich_runs(self, text: str, size: int) -> list:
+        """
+        把文字按字体分段，中文字体中缺字的字符改用另一种字体，返回[[字体, 文字], ...]。
+        """
+        atlas = self.get_atlas(size)
+        runs = []
+        for ch in text:
+            font = int(atlas.blank(ch))
+            if runs and runs[-1][0] == font:
+                runs[-1][1] += ch
+            else:
+                runs.append([font, ch])
+        return runs
+
+    def rich_width(self, text: str, size: int = 0) -> int:
+        """
+        render_rich渲染出的宽度，按字体度量计算，不生成Surface也不占用文字缓存。
+        """
+        return sum(self.get_font(font, size).size(run)[0] for font, run in self.rich_runs(text, size))
+
+    def render_rich(self, text: str, size: int = 0, color: tuple = None) -> pygame.Surface:
+        """
+        渲染中文字体中可能缺字（如'²'）的文字，缺字部分改用另一种字体并按基线对齐。
+        """
+        color = tuple(color if color else self.main_color)
+        key = ('rich', text, size, color)
+        render = self.text_cache.get(key)
+        if render is None:
+            atlas = self.get_atlas(size)
+            parts = [(self.render_text(run, size, font, color),
+                      self.get_font(1, size).get_ascent() if font else atlas.ascent)
+                     for font, run in self.rich_runs(text, size)]
+            ascent = max([atlas.ascent]+[a for r, a in parts])
+            render = counted(pygame.Surface((sum(r.get_width() for r, a in parts),
+                                             max([atlas.height]+[ascent-a+r.get_height() for r, a in parts])), pygame.SRCALPHA))
+            left = 0
+            for r, a in parts:
+                render.blit(r, (left, ascent-a))
+                left += r.get_width()
+            self.text_cache.put(key, render)
+        return render
+
+    def text_icon(self, text: str, size: tuple, color: tuple) -> pygame.Surface:
+        """
+        生成圆角矩形底色、黑色文字的按钮图标（宽度至少为size[0]，文字较长时加宽）。
+        """
+        label = self.render_text(text, 0, 0, (0, 0, 0))
+        icon = counted(pygame.Surface(
+            (max(size[0], label.get_width()+scaled(30)), size[1]), pygame.SRCALPHA))
+        pygame.draw.rect(icon, color, icon.get_rect(), 0, scaled(5))
+        icon.blit(label, label.get_rect(center=icon.get_rect().center))
+        return icon
 
     def draw_text(self, text: str, pos: tuple, align: str = 'topleft', size: int = 1, font: int = 0, color: tuple = None) -> pygame.Rect:
         """
         绘制文字。
         """
-        render = self.fonts[font][size].render(
-            text, True, color if color else self.main_color)
+        render = self.render_text(text, size, font, color)
         rect = render.get_rect()
         exec(f'rect.{align}=pos')
-        return self.screen.blit(render, rect)
+        return self.mark(self.screen.blit(render, rect))
 
-    def error(self, msg: str, serious: bool = False) -> None:
+    def error(self, msg: str, serious: bool = False, then=None) -> None:
         """
         错误弹窗。
         """
         if serious:
-            easygui.msgbox(msg, title='出错了', ok_button='退出程序')
-            pygame.quit()
-            sys.exit()
+            self.message(msg, '出错了', '退出程序', self.quit)
         else:
-            easygui.msgbox(msg, title='提示', ok_button='我知道了')
+            self.message(msg, '提示', '我知道了', then)
+
+    def open_dialog(self, dialog) -> None:
+        self.dialogs.append(dialog)
+        self.damage_all()
+
+    def close_dialog(self, dialog) -> None:
+        if dialog in self.dialogs:
+            self.dialogs.remove(dialog)
+        self.damage_all()
+
+    def draw_dialogs(self) -> None:
+        for dialog in self.dialogs:
+            dialog.draw()
+
+    def message(self, msg: str, title: str, ok_button: str = '我知道了', then=None) -> None:
+        """
+        显示消息框，关闭后调用then。
+        """
+        self.open_dialog(MessageBox(self, msg, title, ok_button, then))
+
+    def ask_number(self, msg: str, title: str, accept) -> None:
+        """
+        显示数字输入框，确定时以输入的文字调用accept（accept出错视为输入有误）。
+        """
+        self.open_dialog(NumberEntry(self, msg, title, accept))
+
+    def ask_color(self, default, title: str, accept) -> None:
+        """
+        显示颜色选择器，确定时以'#rrggbb'形式的颜色调用accept。
+        """
+        self.open_dialog(ColorPicker(self, default, title, accept))
+
+    def quit(self) -> None:
+        """
+        保存并退出程序。
+        """
+        self.cp.flush()
+        self.save_atlases()
+        self.profiler.close()
+        if self.sweep:
+            self.sweep.stop()
+        # 等已录制的帧在后台写完再退出
+        for recorder in self.recorders:
+            recorder.wait()
+        pygame.quit()
+        sys.exit()
 
     def process_events(self) -> list:
         """
         处理事件。
         """
         ret = []
-        events = pygame.event.get()
+        if self.idle == 'wait' and not self.need_redraw():
+            events = [pygame.event.wait()]+pygame.event.get()
+        else:
+            self.clock.tick(self.max_fps)
+            events = pygame.event.get()
+        self.profiler.begin()
+        if events:
+            self.tick()
+            self.invalidate()
         for event in events:
             if event.type == pygame.MOUSEMOTION:
                 self.mouse_pos = event.pos
@@ -253,16 +1660,99 @@ class Window:
                 ret.append(event)
             elif event.type == pygame.MOUSEBUTTONUP:
                 ret.append(event)
+            elif event.type == pygame.MOUSEWHEEL:
+                ret.append(event)
+            elif event.type == pygame.KEYDOWN and event.key in (pygame.K_F3, pygame.K_F4):
+                # F3显示/隐藏性能浮层，F4导出最近的性能记录
+                self.profiler.process_key_event(event.key)
+            elif event.type in (pygame.KEYDOWN, pygame.TEXTINPUT):
+                ret.append(event)
+            elif event.type == pygame.VIDEORESIZE:
+                # 拖动边框时会连续收到，等尺寸稳定后只重新排版一次
+                self.resize_to = (event.size, self.now)
+                self.damage_all()
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+                self.damage_all()
+            elif event.type == BG_LOADED:
+                self.finish_bg_image()
+            elif event.type == RECORD_DONE:
+                self.recorders.remove(event.recorder)
+                if event.error:
+                    self.error(f'动画保存失败: {event.error}')
+                else:
+                    self.message(
+                        f'已把{event.frames}帧动画保存到{event.path}', '录制完成')
             elif event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                self.quit()
+        if self.resize_to and self.now-self.resize_to[1] >= RESIZE_DELAY:
+            self.resize(self.resize_to[0])
         return ret
 
     def update(self) -> None:
         """
         刷新窗口。
         """
-        pygame.display.flip()
+        if self.present == 'flip' or self.full_damage:
+            pygame.display.flip()
+        else:
+            rects = self.damaged+self.last_damaged
+            # 变化区域占屏幕大半时，整屏提交反而更快
+            if sum(r.w*r.h for r in rects) > WINDOW_SIZE[0]*WINDOW_SIZE[1]//2:
+                pygame.display.flip()
+            else:
+                pygame.display.update(rects)
+        self.last_damaged = self.damaged
+        self.damaged = []
+        self.full_damage = False
+        # 已经画出最终状态的动画不再需要重绘
+        self.tweens = {tween for tween in self.tweens if tween.active()}
+
+
+class Tween:
+    """
+    从创建时刻起，在一段时间内由0变化到1的动画进度。
+    """
+
+    def __init__(self, window: Window, duration: float) -> None:
+        self.window = window
+        self.duration = duration
+        self.start = window.now
+        window.tweens.add(self)
+
+    def progress(self) -> float:
+        return min(1, (self.window.now-self.start)/self.duration)
+
+    def active(self) -> bool:
+        return self.progress() < 1
+
+
+class Fade:
+    """
+    匀速趋向目标值的不透明度（0~255），用于悬停时的淡入淡出。
+    """
+
+    def __init__(self, window: Window, duration: float = 0.5) -> None:
+        self.window = window
+        self.duration = duration
+        self.value = 0
+        self.target = 0
+        self.start = 0
+
+    def set(self, target: int) -> None:
+        if target != self.target:
+            self.value = self.get()
+            self.target = target
+            self.start = self.window.now
+            self.window.tweens.add(self)
+
+    def get(self) -> int:
+        step = (self.window.now-self.start)/self.duration*255
+        if self.target > self.value:
+            return int(min(self.target, self.value+step))
+        return int(max(self.target, self.value-step))
+
+    def active(self) -> bool:
+        return self.get() != self.target
 
 
 class Button:
@@ -276,34 +1766,51 @@ class Button:
         self.text = text
         self.rect = self.icon.get_rect()
         exec(f'self.rect.{align}=pos')
-        self.touch_time = 0
+        self.fade = Fade(window)
+        self.theme = None
+        self.in_dialog = False
+        # 上一帧提交的绘制状态和区域
+        self.shown = None
 
-    def draw(self) -> pygame.Rect:
-        if self.touch_time <= 0 and self.rect.collidepoint(*self.window.mouse_pos):
-            self.touch_time = time.time()
-        elif self.touch_time > 0 and not self.rect.collidepoint(*self.window.mouse_pos):
-            self.touch_time = -time.time()-min(0.5, abs(time.time()-self.touch_time))
-        alpha = int((min(0.5, time.time()-self.touch_time) if self.touch_time
-                     > 0 else max(0, -time.time()-self.touch_time))*510)
-        if self.background:
-            alpha_surface = pygame.Surface(
-                self.icon.get_size(), pygame.SRCALPHA)
-            if self.background == 'circle':
-                pygame.draw.circle(alpha_surface, (*self.window.main_color, alpha),
-                                   (self.size[0]//2, self.size[1]//2), self.size[0]//2)
-                self.window.screen.blit(alpha_surface, self.rect)
-            elif self.background == 'rect':
-                pygame.draw.rect(alpha_surface, (*self.window.main_color, alpha),
-                                 pygame.Rect((0, 0), self.size), 0, 5)
-            self.window.screen.blit(alpha_surface, self.rect)
+    def prepare(self) -> None:
+        """
+        预先生成悬停时的背景和提示文字，主题颜色改变时才重新生成。
+        """
+        self.theme = tuple(self.window.main_color)
+        self.halo = counted(pygame.Surface(self.size, pygame.SRCALPHA))
+        if self.background == 'circle':
+            pygame.draw.circle(self.halo, self.theme,
+                               (self.size[0]//2, self.size[1]//2), self.size[0]//2)
+        elif self.background == 'rect':
+            pygame.draw.rect(self.halo, self.theme,
+                             pygame.Rect((0, 0), self.size), 0, scaled(5))
         if self.text:
-            tip = self.window.fonts[0][0].render(
-                self.text, True, (0, 0, 255), self.window.main_color)
-            tip.set_alpha(alpha)
-            rect = tip.get_rect()
-            rect.midright = self.rect.midleft
-            self.window.screen.blit(tip, rect)
-        return self.window.screen.blit(self.icon, self.rect)
+            # 复制一份，调整不透明度时不影响文字缓存中的同一张图
+            self.tip = counted(self.window.render_text(
+                self.text, 0, 0, (0, 0, 255), True, self.theme).copy())
+
+    def draw(self) -> pygame.Rect:
+        if self.theme != tuple(self.window.main_color):
+            self.prepare()
+        # 有对话框打开时，对话框以外的控件不响应悬停
+        hovered = self.rect.collidepoint(*self.window.mouse_pos) and \
+            (self.in_dialog or not self.window.dialogs)
+        self.fade.set(255 if hovered else 0)
+        alpha = self.fade.get()
+        rects = [self.rect.copy()]
+        if alpha:
+            if self.background:
+                self.halo.set_alpha(alpha)
+                self.window.screen.blit(self.halo, self.rect)
+            if self.text:
+                self.tip.set_alpha(alpha)
+                rect = self.tip.get_rect()
+                rect.midright = self.rect.midleft
+                rects.append(self.window.screen.blit(self.tip, rect))
+        self.window.screen.blit(self.icon, self.rect)
+        self.window.mark_changed(
+            self, (self.rect.topleft, self.theme, alpha), rects)
+        return self.rect
 
     def move(self, pos: tuple) -> None:
         self.rect = self.icon.get_rect()
@@ -329,58 +1836,72 @@ class Slider:
         self.setting = False
         self.click_pos = (0, 0)
         self.color = self.window.main_color
-        self.icon = pygame.transform.scale(pygame.image.load(
-            os.path.join(RESOURCES, 'icons', 'crystal.png')), (size, size))
-        self.warning = pygame.transform.scale(pygame.image.load(
-            os.path.join(RESOURCES, 'icons', 'warning.png')), (size, size))
+        self.icon = self.window.assets.icon('crystal', (size, size))
+        self.warning = self.window.assets.icon('warning', (size, size))
         self.icon_rect = self.icon.get_rect()
-        self.bar = pygame.Surface((length, width), pygame.SRCALPHA)
+        self.bar = counted(pygame.Surface((length, width), pygame.SRCALPHA))
         pygame.draw.rect(self.bar, self.color,
                          pygame.Rect((0, 0), (length, width)), 0, width//2)
         self.bar_rect = self.bar.get_rect()
         exec(f'self.bar_rect.{self.align}=pos')
-        self.touch_time = 0
+        self.fade = Fade(window)
+        self.shown = None
+        self.prepare()
+
+    def prepare(self) -> None:
+        """
+        预先生成悬停时的背景和提示文字。
+        """
+        self.halo = counted(pygame.Surface((self.size, self.size), pygame.SRCALPHA))
+        pygame.draw.circle(self.halo, self.color,
+                           (self.size//2, self.size//2), self.size//2)
+        self.tip = counted(self.window.render_text(
+            '点击以精确设置'+self.sdtext, 0, 0, (0, 0, 255), True, self.color).copy())
 
     def draw(self) -> pygame.Rect:
         if self.color != self.window.main_color:
             self.color = self.window.main_color
-            self.bar = pygame.Surface(
-                (self.length, self.width), pygame.SRCALPHA)
+            self.bar = counted(pygame.Surface(
+                (self.length, self.width), pygame.SRCALPHA))
             pygame.draw.rect(self.bar, self.color,
                              pygame.Rect((0, 0), (self.length, self.width)), 0, self.width//2)
             self.bar_rect = self.bar.get_rect()
             exec(f'self.bar_rect.{self.align}=self.pos')
+            self.prepare()
         self.window.screen.blit(self.bar, self.bar_rect)
-        if self.touch_time <= 0 and self.icon_rect.collidepoint(*self.window.mouse_pos):
-            self.touch_time = time.time()
-        elif self.touch_time > 0 and not self.icon_rect.collidepoint(*self.window.mouse_pos) and not self.setting:
-            self.touch_time = -time.time()-min(0.5, abs(time.time()-self.touch_time))
+        if self.icon_rect.collidepoint(*self.window.mouse_pos) and not self.window.dialogs:
+            self.fade.set(255)
+        elif not self.setting:
+            self.fade.set(0)
         if self.setting:
             if not 0 <= self.getvalue() <= 1:
                 self.setvalue(max(0, min(1, self.getvalue())))
             elif self.window.mouse_pos != self.click_pos:
                 self.setvalue(max(0, min(1,
                                          (self.window.mouse_pos[0]-self.bar_rect.left-self.size/2)/(self.length-self.size))))
-        alpha = int((min(0.5, time.time()-self.touch_time) if self.touch_time
-                    > 0 else max(0, -time.time()-self.touch_time))*510)
-        alpha_surface = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-        pygame.draw.circle(alpha_surface, (*self.window.main_color,
-                           alpha), (self.size//2, self.size//2), self.size//2)
+        alpha = self.fade.get()
         self.icon_rect.midbottom = (
             self.bar_rect.left+self.size/2+(self.length-self.size)*max(0, min(1, self.getvalue())), self.bar_rect.centery)
-        self.window.screen.blit(alpha_surface, self.icon_rect)
+        if alpha:
+            self.halo.set_alpha(alpha)
+            self.window.screen.blit(self.halo, self.icon_rect)
+        valid = 0 <= self.getvalue() <= 1
         self.window.screen.blit(
-            self.icon if 0 <= self.getvalue() <= 1 else self.warning, self.icon_rect)
-        if self.touch_time > 0 and self.setdirectly and (not pygame.mouse.get_pressed()[0] or self.window.mouse_pos == self.click_pos):
-            tip = self.window.fonts[0][0].render(
-                '点击以精确设置'+self.sdtext, True, (0, 0, 255), self.window.main_color)
-            tip.set_alpha(alpha)
-            rect = tip.get_rect()
+            self.icon if valid else self.warning, self.icon_rect)
+        rects = [self.bar_rect.copy(), self.icon_rect.copy()]
+        tip = alpha and self.fade.target and self.setdirectly and (
+            not pygame.mouse.get_pressed()[0] or self.window.mouse_pos == self.click_pos)
+        if tip:
+            self.tip.set_alpha(alpha)
+            rect = self.tip.get_rect()
             rect.midright = self.icon_rect.midleft
-            self.window.screen.blit(tip, rect)
+            rects.append(self.window.screen.blit(self.tip, rect))
+        self.window.mark_changed(self, (self.bar_rect.topleft, self.icon_rect.topleft,
+                                        self.color, valid, alpha, bool(tip)), rects)
         return self.bar_rect
 
     def move(self, pos: tuple) -> None:
+        self.pos = pos
         self.bar_rect = self.bar.get_rect()
         exec(f'self.bar_rect.{self.align}=pos')
 
@@ -392,92 +1913,948 @@ class Slider:
     def process_release_event(self, mouse_pos: tuple) -> None:
         if self.setting:
             self.setting = False
+            # 松开滑块时不必再等，由后台线程立即写入
+            self.window.cp.save(0)
             if mouse_pos == self.click_pos and self.setdirectly:
                 self.setdirectly()
 
 
-class Graph:
-    def __init__(self, window: Window) -> None:
+class Text:
+    """
+    保留模式的文字控件，内容不变时直接复用渲染结果。
+    """
+
+    def __init__(self, window: Window, text, size=1, font=0, color: tuple = None) -> None:
+        self.window = window
+        self.text = text
+        self.size = size
+        self.font = font
+        self.color = color
+        self.content = None
+        self.surface = None
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.shown = None
+
+    def refresh(self) -> bool:
+        """
+        更新文字内容，返回尺寸是否发生变化。
+        """
+        text = self.text() if callable(self.text) else self.text
+        size = self.size() if callable(self.size) else self.size
+        font = self.font() if callable(self.font) else self.font
+        content = (text, size, font, tuple(
+            self.color if self.color else self.window.main_color))
+        if content == self.content:
+            return False
+        self.content = content
+        self.surface = self.window.render_text(text, size, font, self.color)
+        resized = self.surface.get_size() != self.rect.size
+        self.rect.size = self.surface.get_size()
+        return resized
+
+    def move(self, pos: tuple, align: str = 'topleft') -> pygame.Rect:
+        self.refresh()
+        exec(f'self.rect.{align}=pos')
+        return self.rect
+
+    def draw(self) -> pygame.Rect:
+        self.window.screen.blit(self.surface, self.rect)
+        self.window.mark_changed(
+            self, (self.content, self.rect.topleft), [self.rect.copy()])
+        return self.rect
+
+
+class Swatch:
+    """
+    颜色预览方块。
+    """
+
+    def __init__(self, window: Window, getcolor) -> None:
+        self.window = window
+        self.getcolor = getcolor
+        self.color = None
+        self.surface = counted(pygame.Surface(scaled((20, 20)), pygame.SRCALPHA))
+        self.rect = self.surface.get_rect()
+        self.shown = None
+
+    def move(self, pos: tuple) -> pygame.Rect:
+        self.rect.topleft = pos
+        return self.rect
+
+    def draw(self) -> pygame.Rect:
+        color = tuple(self.getcolor())
+        if color != self.color:
+            self.color = color
+            self.surface.fill((0, 0, 0, 0))
+            pygame.draw.rect(self.surface, color,
+                             self.surface.get_rect(), 0, scaled(3))
+            pygame.draw.rect(self.surface, (255, 255, 255),
+                             self.surface.get_rect(), 1, scaled(3))
+        self.window.screen.blit(self.surface, self.rect)
+        self.window.mark_changed(
+            self, (self.color, self.rect.topleft), [self.rect.copy()])
+        return self.rect
+
+
+class TextField:
+    """
+    对话框中的单行输入框。
+    """
+
+    def __init__(self, window: Window, rect: pygame.Rect, chars: str, limit: int = 20, text: str = '') -> None:
+        self.window = window
+        self.rect = rect
+        self.chars = chars
+        self.limit = limit
+        self.text = text
+        self.focused = True
+        pygame.key.start_text_input()
+        pygame.key.set_text_input_rect(rect)
+
+    def process_event(self, event) -> bool:
+        """
+        处理键盘输入，返回文字是否改变。
+        """
+        if event.type == pygame.TEXTINPUT:
+            text = ''.join(c for c in event.text if c in self.chars)
+            text = text[:self.limit-len(self.text)]
+            self.text += text
+            return bool(text)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_BACKSPACE and self.text:
+            self.text = self.text[:-1]
+            return True
+        return False
+
+    def draw(self) -> None:
+        pygame.draw.rect(self.window.screen, self.window.main_color,
+                         self.rect, 2, 5)
+        rect = self.window.draw_text(self.text, (self.rect.left+scaled(10), self.rect.centery),
+                                     'midleft', 0, 1)
+        if self.focused:
+            pygame.draw.line(self.window.screen, self.window.main_color,
+                             (rect.right+2, self.rect.top+scaled(8)), (rect.right+2, self.rect.bottom-scaled(8)), 2)
+
+
+class Dialog:
+    """
+    在窗口内绘制的模态对话框：打开时接收所有输入事件，画布照常刷新。
+    """
+
+    def __init__(self, window: Window, title: str, size: tuple) -> None:
+        self.window = window
+        self.title = title
+        self.rect = pygame.Rect((0, 0), size)
+        self.rect.center = (WINDOW_SIZE[0]//2, WINDOW_SIZE[1]//2)
+        self.buttons = []
+
+    def add_button(self, text: str, pos: tuple, todo) -> Button:
+        """
+        添加与设置页按钮同样样式的文字按钮（主题色圆角矩形、黑色文字）。
+        """
+        icon = self.window.text_icon(
+            text, scaled((90, 34)), self.window.main_color)
+        button = Button(self.window, icon, pos, 'midbottom', todo, 'rect')
+        button.in_dialog = True
+        self.buttons.append(button)
+        return button
+
+    def recenter(self) -> None:
+        """
+        窗口尺寸改变后把对话框移回窗口中央。
+        """
+        self.move(WINDOW_SIZE[0]//2-self.rect.centerx,
+                  WINDOW_SIZE[1]//2-self.rect.centery)
+
+    def move(self, dx: int, dy: int) -> None:
+        """
+        平移对话框及其中的按钮，子类还要平移各自的控件。
+        """
+        self.rect.move_ip(dx, dy)
+        for button in self.buttons:
+            button.rect.move_ip(dx, dy)
+
+    def draw(self) -> None:
+        screen = self.window.screen
+        screen.blit(self.window.shade, (0, 0))
+        pygame.draw.rect(screen, (0, 0, 0), self.rect, 0, scaled(10))
+        pygame.draw.rect(screen, self.window.main_color, self.rect, 3, scaled(10))
+        self.window.draw_text(self.title, (self.rect.centerx, self.rect.top+scaled(12)),
+                              'midtop', 1)
+        self.draw_content()
+        for button in self.buttons:
+            button.draw()
+        self.window.mark(self.rect)
+
+    def draw_content(self) -> None:
+        pass
+
+    def process_event(self, event) -> None:
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            for button in self.buttons:
+                button.process_click_event(event.pos)
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                self.cancel()
+            elif event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+                self.confirm()
+
+    def confirm(self) -> None:
+        self.close()
+
+    def cancel(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.window.close_dialog(self)
+
+
+def wrap_text(window: Window, text: str, width: int) -> list:
+    """
+    按显示宽度把文字拆成多行（只量宽度，不渲染）。
+    """
+    lines = []
+    for paragraph in text.strip('\n').split('\n'):
+        line, line_width = '', 0
+        for ch in paragraph:
+            # 图集按单个字形拼接，逐字累加宽度即可
+            ch_width = window.rich_width(ch)
+            if line and line_width+ch_width > width:
+                lines.append(line)
+                line, line_width = '', 0
+            line += ch
+            line_width += ch_width
+        lines.append(line)
+    return lines
+
+
+class MessageBox(Dialog):
+    """
+    消息框。
+    """
+
+    def __init__(self, window: Window, msg: str, title: str, ok_button: str = '我知道了', then=None) -> None:
+        self.lines = wrap_text(window, msg, WINDOW_SIZE[0]-scaled(160))
+        width = max([window.render_text(title, 1).get_width()] +
+                    [window.render_rich(line).get_width() for line in self.lines])
+        super().__init__(window, title,
+                         (max(scaled(360), width+scaled(60)), scaled(130)+len(self.lines)*scaled(26)))
+        self.then = then
+        self.add_button(ok_button, (self.rect.centerx,
+                        self.rect.bottom-scaled(16)), self.confirm)
+
+    def draw_content(self) -> None:
+        for i, line in enumerate(self.lines):
+            self.window.mark(self.window.screen.blit(
+                self.window.render_rich(line), (self.rect.left+scaled(30), self.rect.top+scaled(62)+i*scaled(26))))
+
+    def confirm(self) -> None:
+        self.close()
+        if self.then:
+            self.then()
+
+    def cancel(self) -> None:
+        self.confirm()
+
+
+class NumberEntry(Dialog):
+    """
+    数字输入框：输入有误时在框内提示，不关闭对话框。
+    """
+
+    def __init__(self, window: Window, msg: str, title: str, accept) -> None:
+        width = max(window.render_text(msg, 0).get_width(),
+                    window.render_text(title, 1).get_width())
+        super().__init__(window, title, (max(scaled(420), width+scaled(60)), scaled(230)))
+        self.msg = msg
+        self.accept = accept
+        self.hint = ''
+        self.field = TextField(window, pygame.Rect(self.rect.left+scaled(30), self.rect.top+scaled(92), self.rect.width-scaled(60), scaled(40)),
+                               '0123456789.-+')
+        self.add_button('确定', (self.rect.centerx-scaled(60),
+                        self.rect.bottom-scaled(16)), self.confirm)
+        self.add_button('取消', (self.rect.centerx+scaled(60),
+                        self.rect.bottom-scaled(16)), self.cancel)
+
+    def move(self, dx: int, dy: int) -> None:
+        super().move(dx, dy)
+        self.field.rect.move_ip(dx, dy)
+        pygame.key.set_text_input_rect(self.field.rect)
+
+    def draw_content(self) -> None:
+        self.window.draw_text(self.msg, (self.rect.left+scaled(30), self.rect.top+scaled(60)),
+                              'topleft', 0)
+        self.field.draw()
+        if self.hint:
+            self.window.draw_text(self.hint, (self.rect.left+scaled(30), self.rect.top+scaled(138)),
+                                  'topleft', 0, 0, (255, 80, 80))
+
+    def process_event(self, event) -> None:
+        if self.field.process_event(event):
+            self.hint = ''
+        else:
+            super().process_event(event)
+
+    def confirm(self) -> None:
+        if not self.field.text:
+            self.close()
+            return
+        try:
+            self.accept(self.field.text)
+        except:
+            self.hint = '输入有误，请重新输入!'
+            return
+        self.close()
+
+
+class ColorPicker(Dialog):
+    """
+    颜色选择器：左侧为饱和度-明度平面，右侧为色相条。
+    """
+    PLANE = 200
+
+    def __init__(self, window: Window, default, title: str, accept) -> None:
+        super().__init__(window, title, scaled((460, 340)))
+        # 平面和色相条的边长（像素）
+        self.plane_size = scaled(self.PLANE)
+        if isinstance(default, str):
+            default = [int(default[i:i+2], 16) for i in range(1, 7, 2)]
+        self.old = tuple(default)
+        self.hsv = colorsys.rgb_to_hsv(*(x/255 for x in self.old))
+        self.accept = accept
+        self.drag = None
+        self.plane_rect = pygame.Rect(self.rect.left+scaled(25), self.rect.top+scaled(60),
+                                      self.plane_size, self.plane_size)
+        self.hue_rect = pygame.Rect(self.plane_rect.right+scaled(15), self.plane_rect.top,
+                                    scaled(24), self.plane_size)
+        y = np.linspace(0, 1, self.plane_size)[np.newaxis, :]
+        self.hue_bar = counted(pygame.surfarray.make_surface(
+            (hsv_to_rgb(y, 1, 1)*255).round().astype(np.uint8).repeat(scaled(24), 0)))
+        self.plane = None
+        self.plane_hue = None
+        self.field = TextField(window, pygame.Rect(self.hue_rect.right+scaled(20), self.plane_rect.top+scaled(140), scaled(130), scaled(40)),
+                               '0123456789abcdefABCDEF', 6, hex_color(self.old)[1:])
+        self.add_button('确定', (self.rect.centerx-scaled(60),
+                        self.rect.bottom-scaled(16)), self.confirm)
+        self.add_button('取消', (self.rect.centerx+scaled(60),
+                        self.rect.bottom-scaled(16)), self.cancel)
+
+    def color(self) -> tuple:
+        return tuple(round(x*255) for x in colorsys.hsv_to_rgb(*self.hsv))
+
+    def move(self, dx: int, dy: int) -> None:
+        super().move(dx, dy)
+        for rect in (self.plane_rect, self.hue_rect, self.field.rect):
+            rect.move_ip(dx, dy)
+        pygame.key.set_text_input_rect(self.field.rect)
+
+    def draw_content(self) -> None:
+        screen = self.window.screen
+        h, s, v = self.hsv
+        # 色相改变时才重新生成饱和度-明度平面
+        if self.plane_hue != h:
+            self.plane_hue = h
+            n = np.linspace(0, 1, self.plane_size)
+            self.plane = counted(pygame.surfarray.make_surface(
+                (hsv_to_rgb(h, n[:, np.newaxis], 1-n[np.newaxis, :])*255).round().astype(np.uint8)))
+        screen.blit(self.plane, self.plane_rect)
+        screen.blit(self.hue_bar, self.hue_rect)
+        pygame.draw.circle(screen, (255, 255, 255) if v < 0.5 else (0, 0, 0),
+                           (self.plane_rect.left+s*(self.plane_size-1), self.plane_rect.top+(1-v)*(self.plane_size-1)), scaled(6), 2)
+        y = self.hue_rect.top+h*(self.plane_size-1)
+        pygame.draw.line(screen, (255, 255, 255), (self.hue_rect.left-3, y),
+                         (self.hue_rect.right+2, y), 3)
+        left = self.field.rect.left
+        width, height = scaled((130, 50))
+        pygame.draw.rect(screen, self.old,
+                         (left, self.plane_rect.top, width, height))
+        pygame.draw.rect(screen, self.color(),
+                         (left, self.plane_rect.top+height, width, height))
+        pygame.draw.rect(screen, self.window.main_color,
+                         (left, self.plane_rect.top, width, height*2), 2)
+        self.window.draw_text('#', (left-scaled(4), self.field.rect.centery),
+                              'midright', 0, 1)
+        self.field.draw()
+
+    def pick(self, pos: tuple) -> None:
+        h, s, v = self.hsv
+        x = max(0, min(1, (pos[0]-self.plane_rect.left)/(self.plane_size-1)))
+        y = max(0, min(1, (pos[1]-self.plane_rect.top)/(self.plane_size-1)))
+        if self.drag == 'plane':
+            self.hsv = (h, x, 1-y)
+        elif self.drag == 'hue':
+            self.hsv = (y, s, v)
+        self.field.text = hex_color(self.color())[1:]
+
+    def process_event(self, event) -> None:
+        if self.field.process_event(event):
+            if len(self.field.text) == 6:
+                self.hsv = colorsys.rgb_to_hsv(
+                    *(int(self.field.text[i:i+2], 16)/255 for i in range(0, 6, 2)))
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.plane_rect.collidepoint(event.pos):
+            self.drag = 'plane'
+            self.pick(event.pos)
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.hue_rect.inflate(10, 0).collidepoint(event.pos):
+            self.drag = 'hue'
+            self.pick(event.pos)
+        elif event.type == pygame.MOUSEMOTION and self.drag:
+            self.pick(event.pos)
+        elif event.type == pygame.MOUSEBUTTONUP:
+            self.drag = None
+        else:
+            super().process_event(event)
+
+    def confirm(self) -> None:
+        self.close()
+        self.accept(hex_color(self.color()))
+
+
+class Sweep:
+    """
+    参数动画：让系数a、b或c按固定步长在两个值之间匀速变化，步数只由经过的时间决定，与绘制帧率无关。
+    录制时每帧最多前进一步，保证每一步都被录下。
+    """
+
+    def __init__(self, window: Window, graph, name: str, start: float, end: float, duration: float, recorder: Recorder = None) -> None:
+        self.window = window
+        self.graph = graph
+        self.name = name
+        self.start = start
+        self.end = end
+        self.steps = max(1, round(duration*SWEEP_RATE))
+        self.step = 0
+        self.lag = 0.0
+        window.tick()
+        self.last = window.now
+        self.recorder = recorder
+        # 本帧是否进入了新的一步（第一步也要录制）
+        self.stepped = True
+        if window.sweep:
+            window.sweep.stop()
+        window.sweep = self
+        window.tweens.add(self)
+        setattr(graph, name, start)
+
+    def active(self) -> bool:
+        return self.window.sweep is self
+
+    def advance(self) -> None:
+        """
+        按经过的时间推进步数并更新系数（每帧绘制前调用）。
+        """
+        self.window.tick()
+        self.lag += self.window.now-self.last
+        self.last = self.window.now
+        steps = int(self.lag*SWEEP_RATE)
+        if self.recorder:
+            steps = min(steps, 1)
+        self.lag -= steps/SWEEP_RATE
+        if self.recorder:
+            self.lag = min(self.lag, 1/SWEEP_RATE)
+        if steps:
+            self.step = min(self.steps, self.step+steps)
+            self.stepped = True
+            setattr(self.graph, self.name, my_round(
+                self.start+(self.end-self.start)*self.step/self.steps, 4))
+
+    def capture(self) -> None:
+        """
+        录制本帧画面（绘图区和侧边栏画完后调用），最后一步画完后结束动画。
+        """
+        if self.recorder and self.stepped:
+            self.recorder.put(self.window.screen)
+        self.stepped = False
+        if self.step >= self.steps:
+            self.stop()
+
+    def stop(self) -> None:
+        if self.window.sweep is self:
+            self.window.sweep = None
+            if self.recorder:
+                self.recorder.close()
+                self.window.recorders.append(self.recorder)
+
+
+class SweepDialog(Dialog):
+    """
+    参数动画设置：选择系数、起止值和时长，播放或录制。
+    """
+
+    def __init__(self, window: Window, graph) -> None:
+        super().__init__(window, '参数动画', scaled((480, 340)))
+        self.graph = graph
+        self.name = 'a'
+        self.hint = ''
+        self.choices = {name: pygame.Rect(self.rect.left+scaled(150+i*60), self.rect.top+scaled(62), *scaled((50, 34)))
+                        for i, name in enumerate('abc')}
+        self.labels = ('起始值', '终止值', '时长(秒)')
+        self.fields = [TextField(window, pygame.Rect(self.rect.left+scaled(150), self.rect.top+scaled(110+i*50), self.rect.width-scaled(180), scaled(40)),
+                                 '0123456789.-+', 8, text) for i, text in enumerate(('-10', '10', '5'))]
+        self.focus(0)
+        for i, (text, mode) in enumerate((('播放', 'play'), ('录制PNG', 'png'), ('录制GIF', 'gif'), ('取消', None))):
+            self.add_button(text, (self.rect.centerx+scaled((i*2-3)*56), self.rect.bottom-scaled(16)),
+                            (lambda mode=mode: self.start(mode)) if mode else self.cancel)
+
+    def focus(self, index: int) -> None:
+        for i, field in enumerate(self.fields):
+            field.focused = i == index
+        self.field = self.fields[index]
+        pygame.key.set_text_input_rect(self.field.rect)
+
+    def move(self, dx: int, dy: int) -> None:
+        super().move(dx, dy)
+        for rect in list(self.choices.values())+[field.rect for field in self.fields]:
+            rect.move_ip(dx, dy)
+        pygame.key.set_text_input_rect(self.field.rect)
+
+    def draw_content(self) -> None:
+        screen, color = self.window.screen, self.window.main_color
+        self.window.draw_text('系数', (self.rect.left+scaled(30), self.rect.top+scaled(79)),
+                              'midleft', 0)
+        for name, rect in self.choices.items():
+            pygame.draw.rect(screen, color, rect,
+                             0 if name == self.name else 2, 5)
+            self.window.draw_text(name, rect.center, 'center', 1, 1,
+                                  (0, 0, 0) if name == self.name else color)
+        for label, field in zip(self.labels, self.fields):
+            self.window.draw_text(label, (self.rect.left+scaled(30), field.rect.centery),
+                                  'midleft', 0)
+            field.draw()
+        if self.hint:
+            self.window.draw_text(self.hint, (self.rect.left+scaled(30), self.rect.top+scaled(258)),
+                                  'topleft', 0, 0, (255, 80, 80))
+
+    def process_event(self, event) -> None:
+        if self.field.process_event(event):
+            self.hint = ''
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_TAB:
+            self.focus((self.fields.index(self.field)+1) % len(self.fields))
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            for name, rect in self.choices.items():
+                if rect.collidepoint(event.pos):
+                    self.name = name
+            for i, field in enumerate(self.fields):
+                if field.rect.collidepoint(event.pos):
+                    self.focus(i)
+            super().process_event(event)
+        else:
+            super().process_event(event)
+
+    def confirm(self) -> None:
+        self.start('play')
+
+    def start(self, mode: str) -> None:
+        try:
+            start, end, duration = (float(field.text) for field in self.fields)
+            assert(-10 <= start <= 10 and -10 <= end <= 10 and 0 < duration <= 60)
+        except:
+            self.hint = '输入有误：起止值应在±10以内，时长不超过60秒'
+            return
+        recorder = None
+        if mode != 'play':
+            path = f'sweep-{time.strftime("%Y%m%d-%H%M%S")}'
+            try:
+                recorder = Recorder(
+                    path+'.gif' if mode == 'gif' else path, mode == 'gif')
+            except ImportError:
+                self.hint = '录制GIF需要安装Pillow（pip install pillow）'
+                return
+            except OSError:
+                self.hint = '无法创建录制文件夹!'
+                return
+        self.close()
+        Sweep(self.window, self.graph, self.name,
+              start, end, duration, recorder)
+
+
+class Graph(Observable):
+    # 函数系数和计算页状态（点的变化由拟合器的版本号反映）
+    WATCHED = ('a', 'b', 'c', 'calcmode', 'picking', 'adding', 'pinned')
+
+    def __init__(self, window: Window, size: tuple = None) -> None:
         self.window = window
-        self.bg = pygame.Surface(
-            (SIDEBAR_LEFT, WINDOW_SIZE[1]), pygame.SRCALPHA)
-        self.origin_pos = (SIDEBAR_LEFT//2, WINDOW_SIZE[1]//2)
-        self.scale = 10
+        self.size = tuple(size) if size else (SIDEBAR_LEFT, WINDOW_SIZE[1])
+        # 网格按缩放级别缓存成图块，坐标轴与刻度文字分层缓存，均以完全不透明绘制
+        self.tiles = OrderedDict()
+        self.make_layers()
+        self.zoom = DEFAULT_ZOOM
+        self.scale = ZOOM_LEVELS[self.zoom][0]
+        self.origin_pos = (self.size[0]//2, self.size[1]//2)
+        self.view = None
+        self.dragging = None
         self.a = 1
         self.b = 0
         self.c = 0
         self.calcmode = 1
+        # 计算页的点，与拟合器同步修改（只能通过set_points、put_point和remove_point修改）
         self.points = {}
-        self.draw_grid()
+        self.fit = QuadraticFit()
+        # 等待放置的点（第一个为当前点），为空时不在选点状态；adding为连续添加点
+        self.picking = []
+        self.adding = False
+        self.hover = None
+        # 正在拖动的点
+        self.moving = None
+        self.curve_key = None
+        self.layer_key = None
+        self.changed = True
+        self.analysis_result = None
+        # 固定的曲线(a, b, c, 颜色)，只能整体替换；全部曲线一起绘制到比绘图区大一圈的图层上
+        self.pinned = ()
+        self.overlay_key = None
+        self.legend = None
+        self.apply_alpha()
+        self.subscribe(('a', 'b', 'c'), self.coefficients_changed)
+        self.subscribe(('pinned',), self.pinned_changed)
+        # 图层随主题设置更新
+        window.subscribe(('grid_color',), self.draw_grid)
+        window.subscribe(('axis_color',), self.draw_axis)
+        window.subscribe(('grid_alpha', 'axis_alpha'), self.apply_alpha)
+        window.subscribe(('main_color', 'grid_color'), self.invalidate_layer)
+        window.subscribe(('main_color',), self.pinned_changed)
+        window.subscribe(('ui_scale',), self.ui_scale_changed)
+        if not size:
+            # 未指定尺寸时绘图区随窗口改变大小
+            window.subscribe(('size',), self.resize)
+
+    def make_layers(self) -> None:
+        """
+        按绘图区尺寸创建各图层。
+        """
+        self.axis = counted(pygame.Surface(self.size, pygame.SRCALPHA))
+        self.labels = counted(pygame.Surface(self.size, pygame.SRCALPHA))
+        self.layer = counted(pygame.Surface(self.size, pygame.SRCALPHA))
+        self.dash = counted(pygame.Surface((1, self.size[1]), pygame.SRCALPHA))
+        self.dash_color = None
+        self.overlay = None
+        # 窗口背景、网格、坐标轴和刻度文字合成的不透明底图
+        self.backdrop = counted(pygame.Surface(self.size).convert(), 2)
+        self.backdrop_key = None
+
+    def resize(self) -> None:
+        """
+        绘图区随窗口改变大小：重新创建图层，原点相对绘图区中心的位置不变。
+        """
+        size = (SIDEBAR_LEFT, WINDOW_SIZE[1])
+        if size == self.size:
+            return
+        self.move_view((self.origin_pos[0]+(size[0]-self.size[0])//2,
+                        self.origin_pos[1]+(size[1]-self.size[1])//2))
+        self.size = size
+        self.make_layers()
+        self.tiles.clear()
+        self.view = None
+        self.curve_key = None
+        self.layer_key = None
+        self.overlay_key = None
+        self.apply_alpha()
+
+    def ui_scale_changed(self) -> None:
+        """
+        界面缩放改变后网格随之放大（绘图区中心处的坐标不变），并按新字号重新绘制刻度文字、点的编号和图例。
+        """
+        scale = ZOOM_LEVELS[self.zoom][0]
+        cx, cy = self.size[0]/2, self.size[1]/2
+        self.move_view((cx-(cx-self.origin_pos[0])*scale/self.scale,
+                        cy-(cy-self.origin_pos[1])*scale/self.scale))
+        self.scale = scale
+        self.view = None
+        self.layer_key = None
+        self.legend = None
+
+    def coefficients_changed(self) -> None:
+        self.analysis_result = None
+        self.window.invalidate()
+
+    def pinned_changed(self) -> None:
+        self.overlay_key = None
+        self.legend = None
+
+    def pin(self) -> None:
+        """
+        固定当前曲线，颜色按顺序从调色板中选取。
+        """
+        if (self.a, self.b, self.c) not in [pin[:3] for pin in self.pinned]:
+            self.pinned += ((self.a, self.b, self.c,
+                             PIN_COLORS[len(self.pinned) % len(PIN_COLORS)]),)
+
+    def clear_pinned(self) -> None:
+        self.pinned = ()
+
+    def analysis(self) -> ParabolaAnalysis:
+        """
+        当前函数的性质（系数改变前一直复用）。
+        """
+        if self.analysis_result is None:
+            self.analysis_result = ParabolaAnalysis(self.a, self.b, self.c)
+        return self.analysis_result
+
+    def invalidate_layer(self) -> None:
+        self.layer_key = None
 
     def draw_grid(self) -> None:
-        self.bg.fill((0, 0, 0, 0))
-
-        for i in range(self.scale, WINDOW_SIZE[1], self.scale):
-            pygame.draw.line(self.bg, (*self.window.grid_color, self.window.grid_alpha//2 if i % 50 else self.window.grid_alpha),
-                             (0, i), (SIDEBAR_LEFT, i), 1 if i % 50 else 2)
-
-        for i in range(self.scale, SIDEBAR_LEFT, self.scale):
-            pygame.draw.line(self.bg, (*self.window.grid_color, self.window.grid_alpha//2 if i % 50 else self.window.grid_alpha),
-                             (i, 0), (i, WINDOW_SIZE[1]), 1 if i % 50 else 2)
-
-        pygame.draw.line(self.bg, (*self.window.axis_color, self.window.axis_alpha),
-                         (5, self.origin_pos[1]), (SIDEBAR_LEFT-5, self.origin_pos[1]), 3)
-        pygame.draw.lines(self.bg, (*self.window.axis_color, self.window.axis_alpha), False, (
-            (SIDEBAR_LEFT-15, self.origin_pos[1]-10),
-            (SIDEBAR_LEFT-5, self.origin_pos[1]),
-            (SIDEBAR_LEFT-15, self.origin_pos[1]+10)), 3)
-        r = self.window.fonts[1][1].render('x', True, self.window.axis_color)
-        r.set_alpha(self.window.axis_alpha)
-        self.bg.blit(r, (SIDEBAR_LEFT-25, self.origin_pos[1]+5))
-
-        pygame.draw.line(self.bg, (*self.window.axis_color, self.window.axis_alpha),
-                         (self.origin_pos[0], 5), (self.origin_pos[0], SIDEBAR_LEFT-5), 3)
-        pygame.draw.lines(self.bg, (*self.window.axis_color, self.window.axis_alpha), False, (
-            (self.origin_pos[0]-10, 15),
-            (self.origin_pos[0], 5),
-            (self.origin_pos[0]+10, 15)), 3)
-        r = self.window.fonts[1][1].render('y', True, self.window.axis_color)
-        r.set_alpha(self.window.axis_alpha)
-        rect = r.get_rect()
-        rect.topright = (self.origin_pos[0]-5, 10)
-        self.bg.blit(r, rect)
-
-        r = self.window.fonts[1][1].render('O', True, self.window.axis_color)
-        r.set_alpha(self.window.axis_alpha)
-        rect = r.get_rect()
-        rect.topright = (self.origin_pos[0]-5, self.origin_pos[1]+5)
-        self.bg.blit(r, rect)
-
-        for i in (-25, -20, -15, -10, -5, 5, 10, 15, 20, 25):
-            r = self.window.fonts[1][0].render(
-                str(i), True, self.window.axis_color)
-            r.set_alpha(self.window.axis_alpha)
+        """
+        丢弃已缓存的网格图块（网格颜色改变时调用）。
+        """
+        self.tiles.clear()
+        self.changed = True
+        self.backdrop_key = None
+
+    def grid_tile(self) -> tuple:
+        """
+        获取当前缩放级别的网格图块及主网格线间距（像素）。
+        图块比绘图区大一个主网格间距，平移时只需改变贴图偏移量。
+        """
+        key = (self.scale, tuple(self.window.grid_color))
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+        period = round(self.scale*ZOOM_LEVELS[self.zoom][1])
+        minor = period//5
+        tile = counted(pygame.Surface(
+            (self.size[0]+period, self.size[1]+period), pygame.SRCALPHA))
+        for i in range(0, tile.get_height(), minor):
+            pygame.draw.line(tile, (*self.window.grid_color, 127 if i % period else 255),
+                             (0, i), (tile.get_width(), i), 1 if i % period else 2)
+        for i in range(0, tile.get_width(), minor):
+            pygame.draw.line(tile, (*self.window.grid_color, 127 if i % period else 255),
+                             (i, 0), (i, tile.get_height()), 1 if i % period else 2)
+        self.tiles[key] = (tile, period)
+        if len(self.tiles) > 4:
+            self.tiles.popitem(last=False)
+        return self.tiles[key]
+
+    def draw_axis(self) -> None:
+        """
+        绘制坐标轴图层和刻度文字图层（不透明度在合成时应用）。
+        """
+        self.axis.fill((0, 0, 0, 0))
+        self.labels.fill((0, 0, 0, 0))
+        self.changed = True
+        self.backdrop_key = None
+        (w, h), (ox, oy) = self.size, self.origin_pos
+
+        if 0 <= oy <= h:
+            pygame.draw.line(self.axis, self.window.axis_color,
+                             (5, oy), (w-5, oy), 3)
+            pygame.draw.lines(self.axis, self.window.axis_color, False, (
+                (w-15, oy-10),
+                (w-5, oy),
+                (w-15, oy+10)), 3)
+            self.labels.blit(self.window.render_text('x', 1, 1, self.window.axis_color),
+                             (w-scaled(25), oy+5))
+
+        if 0 <= ox <= w:
+            pygame.draw.line(self.axis, self.window.axis_color,
+                             (ox, 5), (ox, h-5), 3)
+            pygame.draw.lines(self.axis, self.window.axis_color, False, (
+                (ox-10, 15),
+                (ox, 5),
+                (ox+10, 15)), 3)
+            r = self.window.render_text('y', 1, 1, self.window.axis_color)
             rect = r.get_rect()
-            rect.midtop = (self.origin_pos[0] +
-                           i*self.scale, self.origin_pos[1]+5)
-            self.bg.blit(r, rect)
-            rect.midright = (
-                self.origin_pos[0]-5, self.origin_pos[1]-i*self.scale)
-            self.bg.blit(r, rect)
+            rect.topright = (ox-5, 10)
+            self.labels.blit(r, rect)
+
+        if 0 <= ox <= w and 0 <= oy <= h:
+            r = self.window.render_text('O', 1, 1, self.window.axis_color)
+            rect = r.get_rect()
+            rect.topright = (ox-5, oy+5)
+            self.labels.blit(r, rect)
+
+        # 刻度文字跟随坐标轴，坐标轴移出画面时停靠在边缘
+        step = ZOOM_LEVELS[self.zoom][1]
+        period = self.scale*step
+        top = min(max(oy, 0), h-scaled(30))+5
+        right = min(max(ox, scaled(40)), w)-5
+        for i in range(-int(ox//period), int((w-ox)//period)+1):
+            x = round(ox+i*period)
+            if i and 15 <= x <= w-15:
+                r = self.window.render_text(
+                    str(my_round(i*step, 2)), 0, 1, self.window.axis_color)
+                self.labels.blit(r, r.get_rect(midtop=(x, top)))
+        for i in range(-int((h-oy)//period), int(oy//period)+1):
+            y = round(oy-i*period)
+            if i and 15 <= y <= h-15:
+                r = self.window.render_text(
+                    str(my_round(i*step, 2)), 0, 1, self.window.axis_color)
+                self.labels.blit(r, r.get_rect(midright=(right, y)))
+
+    def move_view(self, origin_pos: tuple) -> None:
+        """
+        平移视图。
+        """
+        origin_pos = tuple(max(-10**6, min(10**6, round(i)))
+                           for i in origin_pos)
+        if origin_pos != self.origin_pos:
+            self.origin_pos = origin_pos
+            self.window.invalidate()
+
+    def zoom_view(self, pos: tuple, delta: int) -> None:
+        """
+        以指定位置为中心缩放视图。
+        """
+        zoom = max(0, min(len(ZOOM_LEVELS)-1, self.zoom+delta))
+        if zoom == self.zoom:
+            return
+        x = (pos[0]-self.origin_pos[0])/self.scale
+        y = (self.origin_pos[1]-pos[1])/self.scale
+        self.zoom = zoom
+        self.scale = ZOOM_LEVELS[zoom][0]
+        self.move_view((pos[0]-x*self.scale, pos[1]+y*self.scale))
+        self.window.invalidate()
+
+    def reset_view(self) -> None:
+        """
+        恢复默认视图。
+        """
+        self.zoom = DEFAULT_ZOOM
+        self.scale = ZOOM_LEVELS[self.zoom][0]
+        self.move_view((self.size[0]//2, self.size[1]//2))
+        self.window.invalidate()
+
+    def fit_view(self, points) -> None:
+        """
+        选择能完整显示原点和各点的最大缩放级别（至少显示约10个单位长度），并把它们居中。
+        """
+        xs = [0]+[x for x, y in points]
+        ys = [0]+[y for x, y in points]
+        w, h = self.size
+        for zoom in range(len(ZOOM_LEVELS)-1, -1, -1):
+            scale = ZOOM_LEVELS[zoom][0]
+            if scale*10 <= min(w, h) and (max(xs)-min(xs))*scale <= w*0.8 and (max(ys)-min(ys))*scale <= h*0.8:
+                break
+        self.zoom = zoom
+        self.scale = scale
+        self.move_view((w/2-(max(xs)+min(xs))/2*scale,
+                        h/2+(max(ys)+min(ys))/2*scale))
+
+    def process_click_event(self, mouse_pos: tuple, button: int) -> None:
+        if not self.layer.get_rect().collidepoint(mouse_pos):
+            return
+        if self.picking and button == 1:
+            self.place_point(mouse_pos)
+        elif self.picking and button == 3:
+            self.stop_picking()
+        elif button in (1, 3) and self.calcmode & 2 and self.point_at(mouse_pos):
+            # 左键拖动点，右键删除点
+            if button == 1:
+                self.moving = self.point_at(mouse_pos)
+                pygame.mouse.set_cursor(*pygame.cursors.diamond)
+            else:
+                self.remove_point(self.point_at(mouse_pos))
+        elif button == 1:
+            self.dragging = (mouse_pos, self.origin_pos)
+            pygame.mouse.set_cursor(*pygame.cursors.diamond)
+        elif button == 2:
+            self.reset_view()
+
+    def process_motion_event(self, mouse_pos: tuple) -> None:
+        if self.picking:
+            self.hover = self.snap(mouse_pos) if self.layer.get_rect(
+            ).collidepoint(mouse_pos) else None
+        if self.dragging:
+            (x0, y0), (ox, oy) = self.dragging
+            self.move_view((ox+mouse_pos[0]-x0, oy+mouse_pos[1]-y0))
+        if self.moving:
+            point = self.snap(mouse_pos)
+            if point != self.points[self.moving]:
+                self.put_point(self.moving, point)
+
+    def process_release_event(self, mouse_pos: tuple, button: int) -> None:
+        if button == 1 and (self.dragging or self.moving):
+            self.dragging = None
+            self.moving = None
+            pygame.mouse.set_cursor(*pygame.cursors.arrow)
+
+    def process_wheel_event(self, mouse_pos: tuple, delta: int) -> None:
+        if self.layer.get_rect().collidepoint(mouse_pos):
+            self.zoom_view(mouse_pos, delta)
+
+    def process_key_event(self, key: int) -> None:
+        if key == pygame.K_ESCAPE and self.picking:
+            self.stop_picking()
+        elif key == pygame.K_ESCAPE and self.window.sweep:
+            self.window.sweep.stop()
+
+    def snap(self, pos: tuple) -> tuple:
+        """
+        把屏幕坐标吸附到最近的格点，返回函数坐标。
+        """
+        return (my_round((pos[0]-self.origin_pos[0])/self.scale),
+                my_round((self.origin_pos[1]-pos[1])/self.scale))
+
+    def set_points(self, points: dict) -> None:
+        """
+        替换全部的点。
+        """
+        self.points = dict(points)
+        self.fit.clear()
+        for x, y in self.points.values():
+            self.fit.add(x, y)
+        self.window.invalidate()
+
+    def put_point(self, id: int, point: tuple) -> None:
+        """
+        设置或移动一个点（拟合器只需增删一个点）。
+        """
+        if id in self.points:
+            self.fit.remove(*self.points[id])
+        self.points[id] = point
+        self.fit.add(*point)
+        self.window.invalidate()
+
+    def remove_point(self, id: int) -> None:
+        self.fit.remove(*self.points.pop(id))
+        self.window.invalidate()
+
+    def point_at(self, mouse_pos: tuple) -> int:
+        """
+        鼠标位置处的点（重叠时取最上层的），没有时返回None。
+        """
+        for id in reversed(list(self.points)):
+            x, y = self.points[id]
+            if (self.origin_pos[0]+x*self.scale-mouse_pos[0])**2+(self.origin_pos[1]-y*self.scale-mouse_pos[1])**2 <= scaled(10)**2:
+                return id
 
     def set_point(self, id: int) -> None:
+        """
+        进入选点状态：从点id开始，依次放置尚未设置的点1~3。
+        """
+        self.picking = [id]+[i for i in (1, 2, 3)
+                             if i != id and i not in self.points]
+        self.hover = None
         pygame.mouse.set_cursor(*pygame.cursors.tri_left)
-        ok = False
-        while not ok:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if self.bg.get_rect().collidepoint(event.pos):
-                        self.points[id] = (my_round((event.pos[0]-self.origin_pos[0])/self.scale),
-                                           my_round((self.origin_pos[1]-event.pos[1])/self.scale))
-                        if len(set(i[0] for i in self.points.values())) < len(self.points):
-                            self.window.error('不能设置横坐标相同的点!')
-                            self.points.pop(id)
-                        ok = True
-        pygame.mouse.set_cursor(*pygame.cursors.arrow)
+        self.window.invalidate()
+
+    def add_points(self) -> None:
+        """
+        进入连续添加点的状态（先补齐点1~3），直到右键或Esc取消。
+        """
+        self.set_point(min([i for i in (1, 2, 3) if i not in self.points]
+                           + [max([3]+list(self.points))+1]))
+        self.adding = True
+
+    def place_point(self, mouse_pos: tuple) -> None:
+        id = self.picking[0]
+        point = self.snap(mouse_pos)
+        # 点1~3的横坐标互不相同时总能确定一条抛物线
+        if id in (1, 2, 3) and any(p[0] == point[0] for i, p in self.points.items() if i != id and i in (1, 2, 3)):
+            self.window.error('不能设置横坐标相同的点!')
+            return
+        self.put_point(id, point)
+        self.picking = self.picking[1:]
+        if not self.picking and self.adding:
+            self.picking = [max(self.points)+1]
+        if not self.picking:
+            self.stop_picking()
+
+    def stop_picking(self) -> None:
+        if self.picking or self.hover:
+            self.picking = []
+            self.adding = False
+            self.hover = None
+            pygame.mouse.set_cursor(*pygame.cursors.arrow)
+            self.window.invalidate()
 
     def get_a(self) -> float:
         return (self.a/80)**(1/3)+0.5 if self.a > 0 else -(-self.a/80)**(1/3)+0.5
@@ -499,20 +2876,15 @@ class Graph:
         self.c = my_round((value-0.5)*20, 1)
 
     def set_a_d(self) -> None:
-        a = easygui.enterbox(
-            '请输入绝对值不超过 10 的实数（最多精确到小数点后4位）', '设置二次项系数a')
-        if not a:
-            return
-        try:
-            a = my_round(float(a), 4)
+        def accept(text):
+            a = my_round(float(text), 4)
             assert(-10 <= a <= 10)
             self.a = a
-        except:
-            self.window.error('输入有误，请重新输入!')
-            self.set_a_d()
+        self.window.ask_number(
+            '请输入绝对值不超过 10 的实数（最多精确到小数点后4位）', '设置二次项系数a', accept)
 
     def help_a(self) -> None:
-        easygui.msgbox("""在二次函数的一般式 y=ax²+bx+c (a≠0) 中，a为二次项系数。
+        self.window.message("""在二次函数的一般式 y=ax²+bx+c (a≠0) 中，a为二次项系数。
 a的符号决定抛物线的开口方向，a的绝对值大小决定抛物线的开口大小。
 a的绝对值越大，抛物线开口越小，开口过小时难以观察，
 所以本程序中a的取值范围为 ±10 以内。
@@ -520,104 +2892,267 @@ a的绝对值越大，抛物线开口越小，开口过小时难以观察，
 由于a为一个较特殊的系数，本程序中a的设置与显示格式与b,c有所不同。""", '关于二次项系数a')
 
     def set_b_d(self) -> None:
-        b = easygui.enterbox(
-            '请输入绝对值不超过 10 的实数（最多精确到小数点后1位）', '设置一次项系数b')
-        if not b:
-            return
-        try:
-            b = my_round(float(b), 1)
+        def accept(text):
+            b = my_round(float(text), 1)
             assert(-10 <= b <= 10)
             self.b = b
-        except:
-            self.window.error('输入有误，请重新输入!')
-            self.set_b_d()
+        self.window.ask_number(
+            '请输入绝对值不超过 10 的实数（最多精确到小数点后1位）', '设置一次项系数b', accept)
 
     def help_b(self) -> None:
-        easygui.msgbox("""在二次函数的一般式 y=ax²+bx+c (a≠0) 中，b为一次项系数。
+        self.window.message("""在二次函数的一般式 y=ax²+bx+c (a≠0) 中，b为一次项系数。
 当a一定时，b的绝对值越大，抛物线对称轴离y轴越远，可能超出可见范围，
 所以本程序中b的取值范围为 ±10 以内。""", '关于一次项系数b')
 
     def set_c_d(self) -> None:
-        c = easygui.enterbox(
-            '请输入绝对值不超过 10 的实数（最多精确到小数点后1位）', '设置常数项c')
-        if not c:
-            return
-        try:
-            c = my_round(float(c), 1)
+        def accept(text):
+            c = my_round(float(text), 1)
             assert(-10 <= c <= 10)
             self.c = c
-        except:
-            self.window.error('输入有误，请重新输入!')
-            self.set_c_d()
+        self.window.ask_number(
+            '请输入绝对值不超过 10 的实数（最多精确到小数点后1位）', '设置常数项c', accept)
 
     def help_c(self) -> None:
-        easygui.msgbox("""在二次函数的一般式 y=ax²+bx+c (a≠0) 中，c为常数项。
+        self.window.message("""在二次函数的一般式 y=ax²+bx+c (a≠0) 中，c为常数项。
 c的绝对值越大，抛物线与y轴的交点离原点越远，可能超出可见范围
 所以本程序中c的取值范围为 ±10 以内。""", '关于常数项c')
 
     def draw(self) -> None:
-        self.window.screen.blit(self.bg, (0, 0))
+        if (self.scale, self.origin_pos) != self.view:
+            self.view = (self.scale, self.origin_pos)
+            self.draw_axis()
+        # 图像内容未变化时既不重绘图层，也无需提交绘图区
+        key = (self.version, self.fit.version, self.scale, self.origin_pos)
+        if key != self.layer_key:
+            self.layer_key = key
+            self.draw_layer()
+            self.changed = True
+        if self.changed:
+            self.changed = False
+            self.window.mark(self.layer.get_rect())
+        # 底图只在视图、主题或背景改变时重新合成，每帧只需贴一张不透明的图
+        window = self.window
+        key = (self.view, window.version, tuple(window.bg_color),
+               id(window.bg_image))
+        if key != self.backdrop_key:
+            self.backdrop_key = key
+            self.compose_backdrop()
+        window.screen.blit(self.backdrop, (0, 0))
+        if self.pinned:
+            self.draw_pinned()
+        self.window.screen.blit(self.layer, (0, 0))
+        if self.picking and self.hover:
+            self.draw_preview()
+
+    def compose_backdrop(self) -> None:
+        """
+        把本帧已画好的窗口背景、网格、坐标轴和刻度文字依次合成到底图上（结果与逐层贴到屏幕上相同）。
+        """
+        self.backdrop.blit(self.window.screen, (0, 0),
+                           pygame.Rect((0, 0), self.size))
+        tile, period = self.grid_tile()
+        tile.set_alpha(self.window.grid_alpha)
+        self.backdrop.blit(tile, (0, 0), pygame.Rect(
+            (-self.origin_pos[0] % period, -self.origin_pos[1] % period), self.size))
+        self.backdrop.blit(self.axis, (0, 0))
+        self.backdrop.blit(self.labels, (0, 0))
+
+    def draw_preview(self) -> None:
+        """
+        选点时在吸附的格点处绘制十字准线、待放置的点和坐标。
+        """
+        screen = self.window.screen
+        color = self.window.main_color
+        pos = (int(self.origin_pos[0]+self.hover[0]*self.scale),
+               int(self.origin_pos[1]-self.hover[1]*self.scale))
+        self.window.mark(pygame.draw.line(
+            screen, color, (pos[0], 0), (pos[0], self.size[1]-1)))
+        self.window.mark(pygame.draw.line(
+            screen, color, (0, pos[1]), (self.size[0]-1, pos[1])))
+        self.window.mark(pygame.draw.circle(screen, color, pos, scaled(10), 2))
+        r = self.window.render_text(
+            str(self.picking[0]), 0, 1, self.window.main_color)
+        self.window.mark(screen.blit(r, r.get_rect(center=pos)))
+        r = self.window.render_text(
+            f'({self.hover[0]},{self.hover[1]})', 0, 1, self.window.main_color)
+        rect = r.get_rect(bottomleft=(pos[0]+scaled(12), pos[1]-scaled(12)))
+        rect.clamp_ip(self.layer.get_rect())
+        self.window.mark(screen.blit(r, rect))
+
+    def draw_pinned(self) -> None:
+        """
+        绘制固定的曲线和图例。图层只在固定的曲线或缩放变化、平移超出边距时重绘，其余时候错位贴图。
+        """
+        if self.overlay_key is not None:
+            scale, origin_pos = self.overlay_key
+            dx = self.origin_pos[0]-origin_pos[0]
+            dy = self.origin_pos[1]-origin_pos[1]
+        if self.overlay_key is None or scale != self.scale or abs(dx) > PIN_MARGIN or abs(dy) > PIN_MARGIN:
+            self.draw_overlay()
+            dx = dy = 0
+        self.window.screen.blit(self.overlay, (0, 0), pygame.Rect(
+            (PIN_MARGIN-dx, PIN_MARGIN-dy), self.size))
+        if self.legend is None:
+            self.legend = self.draw_legend()
+        self.window.screen.blit(self.legend, self.legend.get_rect(
+            bottomleft=(scaled(10), self.size[1]-scaled(10))))
+
+    def draw_overlay(self) -> None:
+        """
+        将所有固定的曲线绘制到图层上：各曲线的顶点一次算出，再逐条连线。
+        """
+        if self.overlay is None:
+            self.overlay = counted(pygame.Surface(
+                (self.size[0]+PIN_MARGIN*2, self.size[1]+PIN_MARGIN*2), pygame.SRCALPHA))
+        self.overlay.fill((0, 0, 0, 0))
+        self.overlay_key = (self.scale, self.origin_pos)
+        a, b, c = (np.array([pin[i] for pin in self.pinned], float)[:, None]
+                   for i in range(3))
+        px = np.arange(self.overlay.get_width())
+        x = (px-self.origin_pos[0]-PIN_MARGIN)/self.scale
+        # 截断到图层外侧，连续落在图层同一侧外的点只保留首尾，转换成列表和连线的顶点都少得多
+        top, bottom = -4, self.overlay.get_height()+3
+        y = np.clip(self.origin_pos[1]+PIN_MARGIN -
+                    (a*x*x+b*x+c)*self.scale, top, bottom)
+        keep = np.ones(y.shape, bool)
+        keep[:, 1:-1] = ~(((y[:, 1:-1] == top) | (y[:, 1:-1] == bottom))
+                          & (y[:, :-2] == y[:, 1:-1]) & (y[:, 2:] == y[:, 1:-1]))
+        points = np.empty((len(self.pinned), len(px), 2), np.int32)
+        points[:, :, 0] = px
+        points[:, :, 1] = y
+        for pin, curve, mask in zip(self.pinned, points, keep):
+            pygame.draw.lines(self.overlay, pin[3], False,
+                              curve[mask].tolist(), 2)
+
+    def draw_legend(self) -> pygame.Surface:
+        """
+        图例：最近固定的几条曲线的解析式，更早的只显示条数。
+        """
+        lines = [self.window.render_text(format_formula(*pin[:3]), 0, 1, pin[3])
+                 for pin in self.pinned[-PIN_LEGEND:]]
+        if len(self.pinned) > PIN_LEGEND:
+            lines.insert(0, self.window.render_text(
+                f'…另有{len(self.pinned)-PIN_LEGEND}条', 0))
+        legend = counted(pygame.Surface((max(r.get_width() for r in lines),
+                                         sum(r.get_height() for r in lines)), pygame.SRCALPHA))
+        y = 0
+        for r in lines:
+            legend.blit(r, (0, y))
+            y += r.get_height()
+        return legend
+
+    def draw_layer(self) -> None:
+        """
+        将抛物线、对称轴和计算点绘制到透明图层上。
+        """
+        self.layer.fill((0, 0, 0, 0))
         if self.calcmode & 1:
-            pygame.draw.lines(self.window.screen, self.window.main_color, False, [(int(self.origin_pos[0]+i*self.scale), int(self.origin_pos[1] - (
-                self.a*i**2+self.b*i+self.c)*self.scale)) for i in map(lambda x:x/self.scale, range(-self.origin_pos[0], self.origin_pos[0]))], 2)
+            pygame.draw.lines(self.layer,
+                              self.window.main_color, False, self.curve(), 2)
             if self.a:
                 t = int(self.origin_pos[0]-self.b/self.a/2*self.scale)
-                if 0 < t < SIDEBAR_LEFT:
-                    for i in range(0, WINDOW_SIZE[1], 6):
-                        pygame.draw.line(self.window.screen,
-                                         self.window.main_color, (t, i), (t, i+3), 1)
+                if 0 < t < self.size[0]:
+                    self.layer.blit(self.dash_stamp(), (t, 0))
         if self.calcmode & 2:
             for i in self.points:
                 pos = (int(self.origin_pos[0]+self.points[i][0]*self.scale),
                        int(self.origin_pos[1]-self.points[i][1]*self.scale))
-                pygame.draw.circle(self.window.screen,
-                                   self.window.main_color, pos, 10)
-                self.window.draw_text(
-                    str(i), pos, 'center', 0, 1, self.window.grid_color)
+                pygame.draw.circle(self.layer,
+                                   self.window.main_color, pos, scaled(10))
+                r = self.window.render_text(
+                    str(i), 0, 1, self.window.grid_color)
+                self.layer.blit(r, r.get_rect(center=pos))
+
+    def dash_stamp(self) -> pygame.Surface:
+        """
+        预先绘制好的竖直虚线（对称轴）。
+        """
+        if self.dash_color != tuple(self.window.main_color):
+            self.dash_color = tuple(self.window.main_color)
+            self.dash.fill((0, 0, 0, 0))
+            for i in range(0, self.size[1], 6):
+                self.dash.fill(self.window.main_color, (0, i, 1, 4))
+        return self.dash
+
+    def curve(self) -> list:
+        """
+        计算抛物线在屏幕上的折线顶点（参数不变时直接复用）。
+        """
+        key = (self.a, self.b, self.c, self.scale, self.origin_pos)
+        if key != self.curve_key:
+            self.curve_key = key
+            # 只对可见范围内的每一列像素取样
+            px = np.arange(self.size[0])
+            x = (px-self.origin_pos[0])/self.scale
+            y = self.origin_pos[1]-(self.a*x*x+self.b*x+self.c)*self.scale
+            points = np.empty((len(px), 2), np.int32)
+            points[:, 0] = px
+            # 远在屏幕外的点截断到有限范围，避免整数溢出
+            points[:, 1] = np.clip(y, -1e6, 1e6)
+            # pygame.draw.lines 处理列表比处理数组更快，转换只在参数变化时做一次
+            self.curve_points = points.tolist()
+        return self.curve_points
+
+    def apply_alpha(self) -> None:
+        """
+        将不透明度应用到各图层（不需要重绘图层）。
+        """
+        self.axis.set_alpha(self.window.axis_alpha)
+        self.labels.set_alpha(self.window.axis_alpha)
+        self.changed = True
+        self.backdrop_key = None
 
     def set_grid_color(self) -> None:
         """
         设置网格颜色。
         """
-        color = askcolor(self.window.grid_color_hex, '设置网格颜色')
-        if color:
-            self.window.grid_color_hex = color
-            self.window.grid_color = [int(color[i:i+2], 16)
-                                      for i in range(1, 7, 2)]
-            self.window.cp.set('window', 'grid_color', color)
-            self.window.cp.write(open('config.ini', 'w', encoding='utf-8'))
-            self.draw_grid()
+        self.window.ask_color(self.window.grid_color_hex, '设置网格颜色',
+                              self.apply_grid_color)
+
+    def apply_grid_color(self, color: str) -> None:
+        self.window.grid_color_hex = color
+        self.window.grid_color = [int(color[i:i+2], 16)
+                                  for i in range(1, 7, 2)]
+        self.window.invalidate()
+        self.window.cp.set('window', 'grid_color', color)
+        self.window.cp.save()
 
     def set_grid_alpha(self, value: float) -> None:
         """
         设置网格不透明度（参数为小数）。
         """
+        if int(value * 255) == self.window.grid_alpha:
+            return
         self.window.grid_alpha = int(value * 255)
+        self.window.invalidate()
         self.window.cp.set('window', 'grid_alpha', str(self.window.grid_alpha))
-        self.window.cp.write(open('config.ini', 'w', encoding='utf-8'))
-        self.draw_grid()
+        self.window.cp.save()
 
     def set_axis_color(self) -> None:
         """
         设置坐标轴颜色。
         """
-        color = askcolor(self.window.axis_color_hex, '设置坐标轴颜色')
-        if color:
-            self.window.axis_color_hex = color
-            self.window.axis_color = [int(color[i:i+2], 16)
-                                      for i in range(1, 7, 2)]
-            self.window.cp.set('window', 'axis_color', color)
-            self.window.cp.write(open('config.ini', 'w', encoding='utf-8'))
-            self.draw_grid()
+        self.window.ask_color(self.window.axis_color_hex, '设置坐标轴颜色',
+                              self.apply_axis_color)
+
+    def apply_axis_color(self, color: str) -> None:
+        self.window.axis_color_hex = color
+        self.window.axis_color = [int(color[i:i+2], 16)
+                                  for i in range(1, 7, 2)]
+        self.window.invalidate()
+        self.window.cp.set('window', 'axis_color', color)
+        self.window.cp.save()
 
     def set_axis_alpha(self, value: float) -> None:
         """
         设置坐标轴不透明度（参数为小数）。
         """
+        if int(value * 255) == self.window.axis_alpha:
+            return
         self.window.axis_alpha = int(value * 255)
+        self.window.invalidate()
         self.window.cp.set('window', 'axis_alpha', str(self.window.axis_alpha))
-        self.window.cp.write(open('config.ini', 'w', encoding='utf-8'))
-        self.draw_grid()
+        self.window.cp.save()
 
 
 class Sidebar:
@@ -625,193 +3160,203 @@ class Sidebar:
         self.window = window
         self.graph = graph
         self.pages = {'home': '抛物线演示器', 'settings': '设置', 'calc': '计算'}
-        self.icons = {name: pygame.transform.scale(pygame.image.load(
-            os.path.join(RESOURCES, 'icons', name+'.png')), size) for name, size in
-            [('calc', (50, 50)), ('settings', (50, 50)), ('return', (50, 50)), ('change', (65, 30)), ('set', (65, 30)), ('help', (20, 20))]}
-        self.buttons = {}
-        self.sliders = {}
-        self.points_hash = 0
+        self.fit_version = None
+        self.formula_text = None
+        self.text_version = None
+        graph.subscribe(('a', 'b', 'c'), self.coefficients_changed)
+        window.subscribe(('size',), self.size_changed)
+        window.subscribe(('ui_scale',), self.build)
+        self.build()
         self.open('home')
 
+    def build(self) -> None:
+        """
+        按当前界面缩放创建图标和各页面的控件。
+        每个页面的控件只在界面缩放改变时重新创建，之后仅在影响布局的内容变化时重新排版。
+        """
+        self.icons = {name: self.window.assets.icon(name, scaled(size)) for name, size in
+                      [('calc', (50, 50)), ('settings', (50, 50)), ('return', (50, 50)), ('change', (65, 30)), ('set', (65, 30)), ('help', (20, 20))]}
+        self.widgets = {'home': self.build_home(),
+                        'settings': self.build_settings(),
+                        'calc': self.build_calc()}
+        self.key = None
+
     def draw(self) -> None:
-        start = self.window.draw_text(
-            self.pages[self.page], (SIDEBAR_MID, 10-max(0, 1-(time.time()-self.page_open_time)/0.3)**2*100), 'midtop', 3).bottom
+        if self.page == 'calc':
+            self.solve()
+        offset = int((1-self.transition.progress())**2*scaled(100))
+        key = (offset, self.layout_key())
+        # 文字只依赖函数、点和主题设置，这些状态的版本号不变时不必更新文字
+        version = (self.graph.version, self.graph.fit.version,
+                   self.window.version)
+        # 布局状态不变时，只有文字尺寸变化才需要重新排版
+        if key != self.key or version != self.text_version and any([widget.refresh() for widget in self.visible if isinstance(widget, Text)]):
+            self.key = key
+            self.layout(offset)
+        self.text_version = version
+        for widget in self.visible:
+            widget.draw()
+
+    def layout_key(self) -> tuple:
+        """
+        影响当前页面布局的状态。
+        """
         if self.page == 'home':
-            self.draw_home(start)
+            return (bool(self.graph.a),)
         elif self.page == 'settings':
-            self.draw_settings(start)
+            return (self.window.bg_mode,)
         elif self.page == 'calc':
-            self.draw_calc(start)
+            return (self.graph.calcmode == 3, len(self.graph.points) > 3)
 
-    def formula(self) -> str:
-        ret = ''
-
-        if self.graph.a == 1:
-            ret += 'x²'
-        elif self.graph.a == -1:
-            ret += '-x²'
-        elif abs(self.graph.a) >= 0.0001:
-            ret += f'{my_round(self.graph.a,4 if abs(self.graph.a) < 0.01 else 3 if abs(self.graph.a) < 0.1 else 2)}x²'
-
-        if ret and self.graph.b > 0:
-            ret += '+'
-        if self.graph.b == 1:
-            ret += 'x'
-        elif self.graph.b == -1:
-            ret += '-x'
-        elif self.graph.b:
-            ret += f'{my_round(self.graph.b,1)}x'
-
-        if ret and self.graph.c > 0:
-            ret += '+'
-        if self.graph.c or not ret:
-            ret += f'{my_round(self.graph.c, 1)}'
-
-        return 'y='+ret
-
-    def draw_home(self, start) -> None:
-        text = self.formula()
-        self.window.draw_text(text, (SIDEBAR_MID, start+20), 'midtop',
-                              3 if len(text) < 12 else 2 if len(text) < 18 else 1, 1)
-        t = self.window.draw_text('a=0' if abs(self.graph.a) < 0.0001 else f'a={self.graph.a:.4f}'
-                                  if abs(self.graph.a) < 0.01 else f'a={self.graph.a:.3f}'
-                                  if abs(self.graph.a) < 0.1 else f'a={self.graph.a:.2f}',
-                                  (SIDEBAR_LEFT+10, start+80), 'topleft', 1, 1)
-        self.sliders['a'].move((SIDEBAR_LEFT+145, t.centery))
-        if 'help_a' not in self.buttons:
-            self.buttons['help_a'] = Button(self.window, self.icons['help'],
-                                            (WINDOW_SIZE[0]-5, t.centery), 'midright', self.graph.help_a, 'circle', '什么是a')
-        else:
-            self.buttons['help_a'].move((WINDOW_SIZE[0]-5, t.centery))
-        t = self.window.draw_text(
-            f'b={my_round(self.graph.b,1)}', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft', 1, 1)
-        self.sliders['b'].move((SIDEBAR_LEFT+145, t.centery))
-        if 'help_b' not in self.buttons:
-            self.buttons['help_b'] = Button(self.window, self.icons['help'],
-                                            (WINDOW_SIZE[0]-5, t.centery), 'midright', self.graph.help_b, 'circle', '什么是b')
-        else:
-            self.buttons['help_b'].move((WINDOW_SIZE[0]-5, t.centery))
-        t = self.window.draw_text(
-            f'c={my_round(self.graph.c,1)}', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft', 1, 1)
-        self.sliders['c'].move((SIDEBAR_LEFT+145, t.centery))
-        if 'help_c' not in self.buttons:
-            self.buttons['help_c'] = Button(self.window, self.icons['help'],
-                                            (WINDOW_SIZE[0]-5, t.centery), 'midright', self.graph.help_c, 'circle', '什么是c')
-        else:
-            self.buttons['help_c'].move((WINDOW_SIZE[0]-5, t.centery))
-        if self.graph.a:
-            h = my_round(-self.graph.b/self.graph.a/2, 2)
-            k = my_round(self.graph.c-self.graph.b**2/self.graph.a/4, 2)
-            delta = self.graph.b**2-4*self.graph.a*self.graph.c
-            if delta > 0:
-                x = ((-self.graph.b-delta**0.5)/self.graph.a/2,
-                     (-self.graph.b+delta**0.5)/self.graph.a/2)
-            elif delta == 0:
-                x = (-self.graph.b/self.graph.a/2,)
-            else:
-                x = ()
+    def layout(self, offset: int = 0) -> None:
+        """
+        重新排版当前页面。
+        """
+        # 控件位置可能改变，整个侧边栏都要提交
+        self.window.mark(pygame.Rect(
+            SIDEBAR_LEFT, 0, WINDOW_SIZE[0]-SIDEBAR_LEFT, WINDOW_SIZE[1]))
+        widgets = self.widgets[self.page]
+        if 'return' in widgets:
+            widgets['return'].move((SIDEBAR_LEFT+scaled(10), scaled(10)))
+        start = widgets['title'].move(
+            (SIDEBAR_MID, scaled(10)-offset), 'midtop').bottom
+        names = ['title']+getattr(self, 'layout_'+self.page)(start)
+        visible = [widgets[name] for name in names]
+        # 先画文字，再画滑动条和按钮，保证提示框在最上层
+        self.visible = [w for w in visible if not isinstance(w, (Slider, Button))] + \
+            [w for w in visible if isinstance(w, Slider)] + \
+            [w for w in visible if isinstance(w, Button)]
+        self.buttons = {name: widgets[name]
+                        for name in names if isinstance(widgets[name], Button)}
+        self.sliders = {name: widgets[name]
+                        for name in names if isinstance(widgets[name], Slider)}
+
+    def coefficients_changed(self) -> None:
+        self.formula_text = None
+
+    def size_changed(self) -> None:
+        # 控件位置都由layout按当前窗口尺寸计算
+        self.key = None
 
-            t = self.window.draw_text(
-                '开口方向:向'+'上下'[self.graph.a < 0], (SIDEBAR_LEFT+10, t.bottom+10), 'topleft', 0)
-            if 'help_kkfx' not in self.buttons:
-                self.buttons['help_kkfx'] = Button(self.window, self.icons['help'],
-                                                   (WINDOW_SIZE[0]-5, t.centery), 'midright', self.help_kkfx, 'circle', '开口方向的变化规律')
-            else:
-                self.buttons['help_kkfx'].move((WINDOW_SIZE[0]-5, t.centery))
-
-            t = self.window.draw_text(
-                '对称轴:直线', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft', 0)
-            t = self.window.draw_text(
-                f'x={h}', (t.right, t.centery), 'midleft', 0, 1)
-            if 'help_dcz' not in self.buttons:
-                self.buttons['help_dcz'] = Button(self.window, self.icons['help'],
-                                                  (WINDOW_SIZE[0]-5, t.centery), 'midright', self.help_dcz, 'circle', '对称轴的计算方法')
-            else:
-                self.buttons['help_dcz'].move((WINDOW_SIZE[0]-5, t.centery))
-
-            t = self.window.draw_text(
-                '顶点坐标:', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft', 0)
-            t = self.window.draw_text(
-                f'({h},{k})', (t.right, t.centery), 'midleft', 0, 1)
-            if 'help_ddzb' not in self.buttons:
-                self.buttons['help_ddzb'] = Button(self.window, self.icons['help'],
-                                                   (WINDOW_SIZE[0]-5, t.centery), 'midright', self.help_ddzb, 'circle', '顶点坐标的计算方法')
-            else:
-                self.buttons['help_ddzb'].move((WINDOW_SIZE[0]-5, t.centery))
-
-            t = self.window.draw_text(
-                f'最{"大小"[self.graph.a > 0]}值:', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft', 0)
-            t = self.window.draw_text(
-                f'x={h},y={k}', (t.right, t.centery), 'midleft', 0, 1)
-            if 'help_zz' not in self.buttons:
-                self.buttons['help_zz'] = Button(self.window, self.icons['help'],
-                                                 (WINDOW_SIZE[0]-5, t.centery), 'midright', self.help_zz, 'circle', '函数最值与抛物线顶点坐标的关系')
-            else:
-                self.buttons['help_zz'].move((WINDOW_SIZE[0]-5, t.centery))
-
-            t = self.window.draw_text(
-                '增减性:', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft', 0)
-            t = self.window.draw_text(
-                f'x>{h}', (t.right, t.centery), 'midleft', 0, 1)
-            t = self.window.draw_text(
-                '时，y随x的增大而'+('增大' if self.graph.a > 0 else '减小'), (t.right, t.centery), 'midleft', 0)
-            t = self.window.draw_text(
-                f'x<{h}', (t.left, t.bottom), 'topright', 0, 1)
-            t = self.window.draw_text(
-                '时，y随x的增大而'+('增大' if self.graph.a < 0 else '减小'), (t.right, t.centery), 'midleft', 0)
-            if 'help_zjx' not in self.buttons:
-                self.buttons['help_zjx'] = Button(self.window, self.icons['help'],
-                                                  (WINDOW_SIZE[0]-5, t.centery), 'midright', self.help_zjx, 'circle', '增减性的变化规律')
-            else:
-                self.buttons['help_zjx'].move((WINDOW_SIZE[0]-5, t.centery))
-
-            t = self.window.draw_text(
-                '与x轴的交点:', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft', 0)
-            t = self.window.draw_text(','.join(map(lambda x: f'({my_round(x, 2)},0)', x)), (
-                t.right, t.centery), 'midleft', 0, 1) if x else self.window.draw_text('无', (t.right, t.centery), 'midleft', 0)
-            if 'help_xjd' not in self.buttons:
-                self.buttons['help_xjd'] = Button(self.window, self.icons['help'],
-                                                  (WINDOW_SIZE[0]-5, t.centery), 'midright', self.help_xjd, 'circle', '二次函数与一元二次方程的关系')
-            else:
-                self.buttons['help_xjd'].move((WINDOW_SIZE[0]-5, t.centery))
-
-            t = self.window.draw_text(
-                '与y轴的交点:', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft', 0)
-            t = self.window.draw_text(
-                f'(0,{my_round(self.graph.c,2)})', (t.right, t.centery), 'midleft', 0, 1)
-            if 'help_yjd' not in self.buttons:
-                self.buttons['help_yjd'] = Button(self.window, self.icons['help'],
-                                                  (WINDOW_SIZE[0]-5, t.centery), 'midright', self.help_yjd, 'circle', '与y轴交点的计算方法')
-            else:
-                self.buttons['help_yjd'].move((WINDOW_SIZE[0]-5, t.centery))
-        else:
-            self.window.draw_text(
-                '该函数非二次函数，不支持分析。', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft')
-        self.sliders['a'].draw()
-        self.sliders['b'].draw()
-        self.sliders['c'].draw()
-        self.buttons['calc'].draw()
-        self.buttons['settings'].draw()
-        self.buttons['help_a'].draw()
-        self.buttons['help_b'].draw()
-        self.buttons['help_c'].draw()
-        if self.graph.a:
-            self.buttons['help_kkfx'].draw()
-            self.buttons['help_dcz'].draw()
-            self.buttons['help_ddzb'].draw()
-            self.buttons['help_zz'].draw()
-            self.buttons['help_zjx'].draw()
-            self.buttons['help_xjd'].draw()
-            self.buttons['help_yjd'].draw()
+    def formula(self) -> str:
+        """
+        函数解析式（系数改变前一直复用）。
+        """
+        if self.formula_text is None:
+            self.formula_text = format_formula(
+                self.graph.a, self.graph.b, self.graph.c)
+        return self.formula_text
+
+    def build_home(self) -> dict:
+        graph = self.graph
+        def h(): return my_round(graph.analysis().h, 2)
+        def k(): return my_round(graph.analysis().k, 2)
+        def x(): return graph.analysis().roots
+        def up(): return graph.analysis().opens_up
+        def formula_size(): return 3 if len(self.formula()) < 12 else 2 if len(
+            self.formula()) < 18 else 1
+        widgets = {
+            'title': Text(self.window, self.pages['home'], 3),
+            'formula': Text(self.window, self.formula, formula_size, 1),
+            'a': Text(self.window, lambda: 'a=0' if abs(graph.a) < 0.0001 else f'a={graph.a:.4f}'
+                      if abs(graph.a) < 0.01 else f'a={graph.a:.3f}'
+                      if abs(graph.a) < 0.1 else f'a={graph.a:.2f}', 1, 1),
+            'b': Text(self.window, lambda: f'b={my_round(graph.b,1)}', 1, 1),
+            'c': Text(self.window, lambda: f'c={my_round(graph.c,1)}', 1, 1),
+            'kkfx': Text(self.window, lambda: '开口方向:向'+('上' if up() else '下'), 0),
+            'dcz': Text(self.window, '对称轴:直线', 0),
+            'dcz_value': Text(self.window, lambda: f'x={h()}', 0, 1),
+            'ddzb': Text(self.window, '顶点坐标:', 0),
+            'ddzb_value': Text(self.window, lambda: f'({h()},{k()})', 0, 1),
+            'zz': Text(self.window, lambda: f'最{"小" if up() else "大"}值:', 0),
+            'zz_value': Text(self.window, lambda: f'x={h()},y={k()}', 0, 1),
+            'zjx': Text(self.window, '增减性:', 0),
+            'zjx_gt': Text(self.window, lambda: f'x>{h()}', 0, 1),
+            'zjx_gt_text': Text(self.window, lambda: '时，y随x的增大而'+('增大' if up() else '减小'), 0),
+            'zjx_lt': Text(self.window, lambda: f'x<{h()}', 0, 1),
+            'zjx_lt_text': Text(self.window, lambda: '时，y随x的增大而'+('减小' if up() else '增大'), 0),
+            'xjd': Text(self.window, '与x轴的交点:', 0),
+            'xjd_value': Text(self.window, lambda: ','.join(map(lambda x: f'({my_round(x, 2)},0)', x())) if x() else '无',
+                              0, lambda: 1 if x() else 0),
+            'yjd': Text(self.window, '与y轴的交点:', 0),
+            'yjd_value': Text(self.window, lambda: f'(0,{my_round(graph.c,2)})', 0, 1),
+            'not_quadratic': Text(self.window, '该函数非二次函数，不支持分析。'),
+            'a_slider': Slider(self.window, (0, 0), scaled(SIDEBAR_WIDTH-180), scaled(10), 'midleft', scaled(20),  graph.get_a, graph.set_a, graph.set_a_d, '二次项系数a'),
+            'b_slider': Slider(self.window, (0, 0), scaled(SIDEBAR_WIDTH-180), scaled(10), 'midleft', scaled(20),  graph.get_b, graph.set_b, graph.set_b_d, '一次项系数b'),
+            'c_slider': Slider(self.window, (0, 0), scaled(SIDEBAR_WIDTH-180), scaled(10), 'midleft', scaled(20),  graph.get_c, graph.set_c, graph.set_c_d, '常数项c'),
+            'calc': Button(self.window, self.icons['calc'], (0, 0), 'bottomleft', lambda: self.open('calc'), 'circle', '计算'),
+            'settings': Button(self.window, self.icons['settings'], (0, 0), 'bottomright', lambda: self.open('settings'), 'circle', '设置'),
+            'pin': Button(self.window, self.window.text_icon('固定', scaled((65, 30)), (255, 242, 0)), (0, 0), 'midleft',
+                          graph.pin, 'rect', '把当前曲线固定在图中，便于比较'),
+            'unpin': Button(self.window, self.window.text_icon('清除固定', scaled((65, 30)), (255, 242, 0)), (0, 0), 'midleft',
+                            graph.clear_pinned, 'rect', '清除所有固定的曲线'),
+            'sweep': Button(self.window, self.window.text_icon('动画', scaled((65, 30)), (255, 242, 0)), (0, 0), 'midleft',
+                            lambda: self.window.open_dialog(SweepDialog(self.window, graph)), 'rect', '让系数连续变化，观察抛物线的变化（可录制）')}
+        for name, todo, text in (('help_a', graph.help_a, '什么是a'),
+                                 ('help_b', graph.help_b, '什么是b'),
+                                 ('help_c', graph.help_c, '什么是c'),
+                                 ('help_kkfx', self.help_kkfx, '开口方向的变化规律'),
+                                 ('help_dcz', self.help_dcz, '对称轴的计算方法'),
+                                 ('help_ddzb', self.help_ddzb, '顶点坐标的计算方法'),
+                                 ('help_zz', self.help_zz, '函数最值与抛物线顶点坐标的关系'),
+                                 ('help_zjx', self.help_zjx, '增减性的变化规律'),
+                                 ('help_xjd', self.help_xjd, '二次函数与一元二次方程的关系'),
+                                 ('help_yjd', self.help_yjd, '与y轴交点的计算方法')):
+            widgets[name] = Button(self.window, self.icons['help'],
+                                   (0, 0), 'midright', todo, 'circle', text)
+        return widgets
+
+    def layout_home(self, start) -> list:
+        w = self.widgets['home']
+        names = ['formula', 'a', 'b', 'c', 'a_slider', 'b_slider', 'c_slider',
+                 'calc', 'settings', 'pin', 'unpin', 'sweep', 'help_a', 'help_b', 'help_c']
+        w['formula'].move((SIDEBAR_MID, start+scaled(20)), 'midtop')
+        w['calc'].move((SIDEBAR_LEFT+scaled(10), WINDOW_SIZE[1]-scaled(10)))
+        w['settings'].move((WINDOW_SIZE[0]-scaled(10), WINDOW_SIZE[1]-scaled(10)))
+        x = SIDEBAR_LEFT+scaled(75)
+        for name in ('pin', 'unpin', 'sweep'):
+            w[name].move((x, WINDOW_SIZE[1]-scaled(35)))
+            x = w[name].rect.right+scaled(10)
+        t = w['a'].move((SIDEBAR_LEFT+scaled(10), start+scaled(80)))
+        for name in 'abc':
+            if name != 'a':
+                t = w[name].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+            w[name+'_slider'].move((SIDEBAR_LEFT+scaled(145), t.centery))
+            w['help_'+name].move((WINDOW_SIZE[0]-scaled(5), t.centery))
+
+        if not self.graph.a:
+            w['not_quadratic'].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+            return names+['not_quadratic']
+
+        t = w['kkfx'].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+        w['help_kkfx'].move((WINDOW_SIZE[0]-scaled(5), t.centery))
+        for name in ('dcz', 'ddzb', 'zz'):
+            t = w[name].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+            t = w[name+'_value'].move((t.right, t.centery), 'midleft')
+            w['help_'+name].move((WINDOW_SIZE[0]-scaled(5), t.centery))
+        t = w['zjx'].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+        t = w['zjx_gt'].move((t.right, t.centery), 'midleft')
+        t = w['zjx_gt_text'].move((t.right, t.centery), 'midleft')
+        t = w['zjx_lt'].move(t.bottomleft, 'topright')
+        t = w['zjx_lt_text'].move((t.right, t.centery), 'midleft')
+        w['help_zjx'].move((WINDOW_SIZE[0]-scaled(5), t.centery))
+        for name in ('xjd', 'yjd'):
+            t = w[name].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+            t = w[name+'_value'].move((t.right, t.centery), 'midleft')
+            w['help_'+name].move((WINDOW_SIZE[0]-scaled(5), t.centery))
+        return names+['kkfx', 'dcz', 'dcz_value', 'ddzb', 'ddzb_value', 'zz', 'zz_value',
+                      'zjx', 'zjx_gt', 'zjx_gt_text', 'zjx_lt', 'zjx_lt_text',
+                      'xjd', 'xjd_value', 'yjd', 'yjd_value', 'help_kkfx', 'help_dcz',
+                      'help_ddzb', 'help_zz', 'help_zjx', 'help_xjd', 'help_yjd']
 
     def help_kkfx(self) -> None:
-        easygui.msgbox('当a>0时，抛物线开口向上；当a<0时，抛物线开口向下。', '开口方向的变化规律')
+        self.window.message('当a>0时，抛物线开口向上；当a<0时，抛物线开口向下。', '开口方向的变化规律')
 
     def help_dcz(self) -> None:
-        easygui.msgbox('抛物线的对称轴为直线x=-b/2a (其中a,b分别为二次项与一次项系数)。', '对称轴的计算方法')
+        self.window.message('抛物线的对称轴为直线x=-b/2a (其中a,b分别为二次项与一次项系数)。', '对称轴的计算方法')
 
     def help_ddzb(self) -> None:
-        easygui.msgbox("""【方法一：配方法】
+        self.window.message("""【方法一：配方法】
 从二次函数的二次项和一次项中提出二次项系数，再将括号内式子配成完全平方，
 最终化为 y=a(x-h)²+k 的形式，这个式子被称为顶点式，
 抛物线的顶点坐标为(h,k)。
@@ -823,17 +3368,17 @@ class Sidebar:
 将抛物线的对称轴位置即顶点横坐标代入解析式，即可得到顶点纵坐标。""", '顶点坐标的计算方法')
 
     def help_zz(self) -> None:
-        easygui.msgbox("""设抛物线的顶点坐标为(h,k)。
+        self.window.message("""设抛物线的顶点坐标为(h,k)。
 若a>0，当x=h时，二次函数有最小值k；若a<0，当x=h时，二次函数有最大值k。""", '函数最值与抛物线顶点坐标的关系')
 
     def help_zjx(self) -> None:
-        easygui.msgbox("""若a>0，抛物线对称轴左边下降，右边上升，
+        self.window.message("""若a>0，抛物线对称轴左边下降，右边上升，
 即当x<h时，y随x的增大而减小，当x>h时，y随x的增大而增大；
 若a<0，抛物线对称轴左边上升，右边下降，
 即当x<h时，y随x的增大而增大，当x>h时，y随x的增大而减小。""", '增减性的变化规律')
 
     def help_xjd(self) -> None:
-        easygui.msgbox("""抛物线 y=ax²+bx+c 与x轴交点的横坐标即为方程 ax²+bx+c=0 的解，
+        self.window.message("""抛物线 y=ax²+bx+c 与x轴交点的横坐标即为方程 ax²+bx+c=0 的解，
 与x轴交点的数量与方程的判别式(Δ=b²-4ac)有关。
 当Δ>0时，方程有两个不相等的实数根，抛物线与x轴有两个不重合的交点；
 当Δ=0时，方程有两个相等的实数根，抛物线与x轴有一个交点（两个重合的交点）；
@@ -841,251 +3386,517 @@ class Sidebar:
 """, '二次函数与一元二次方程的关系')
 
     def help_yjd(self) -> None:
-        easygui.msgbox('抛物线与y轴交点的纵坐标即为二次函数的常数项c。', '与y轴交点的计算方法')
-
-    def draw_settings(self, start) -> None:
-        self.buttons['return'].draw()
-
-        t = self.window.draw_text('背景模式:'+('纯色' if self.window.bg_mode ==
-                                           'color' else '图片'), (SIDEBAR_LEFT+10, start+20), 'topleft')
-        if 'change_bg_mode' not in self.buttons:
-            self.buttons['change_bg_mode'] = Button(
-                self.window, self.icons['change'], (WINDOW_SIZE[0]-10, t.centery), 'midright', self.window.change_bg_mode, 'rect')
-            self.buttons['set_bg'] = Button(self.window, self.icons['set'], (
-                self.buttons['change_bg_mode'].rect.left-10, t.centery), 'midright', self.window.set_bg, 'rect')
-        else:
-            self.buttons['change_bg_mode'].move((WINDOW_SIZE[0]-10, t.centery))
-            self.buttons['set_bg'].move(
-                (self.buttons['change_bg_mode'].rect.left-10, t.centery))
-        self.buttons['change_bg_mode'].draw()
-        self.buttons['set_bg'].draw()
-        t = self.window.draw_text(
-            '当前背景:', (SIDEBAR_LEFT+10, t.bottom), 'topleft', 0)
+        self.window.message('抛物线与y轴交点的纵坐标即为二次函数的常数项c。', '与y轴交点的计算方法')
+
+    def build_settings(self) -> dict:
+        window = self.window
+        return {
+            'title': Text(window, self.pages['settings'], 3),
+            'return': Button(window, self.icons['return'], (0, 0), 'topleft', lambda: self.open('home'), 'circle', '返回'),
+            'bg_mode': Text(window, lambda: '背景模式:'+('纯色' if window.bg_mode == 'color' else '图片')),
+            'change_bg_mode': Button(window, self.icons['change'], (0, 0), 'midright', window.change_bg_mode, 'rect'),
+            'set_bg': Button(window, self.icons['set'], (0, 0), 'midright', window.set_bg, 'rect'),
+            'background': Text(window, '当前背景:', 0),
+            'bg_color': Swatch(window, lambda: window.bg_color),
+            'bg_image': Text(window, lambda: os.path.split(window.background)[1], 0),
+            'mask_alpha': Text(window, lambda: '蒙版不透明度:'+str(window.mask_alpha)),
+            'change_mask_alpha': Slider(window, (0, 0), scaled(SIDEBAR_WIDTH-20), scaled(10), 'topleft', scaled(20), lambda: window.mask_alpha/255, window.set_mask_alpha),
+            'main_color': Text(window, '主题颜色:'),
+            'main_color_swatch': Swatch(window, lambda: window.main_color),
+            'set_main_color': Button(window, self.icons['set'], (0, 0), 'midright', window.set_main_color, 'rect'),
+            'grid_color': Text(window, '网格颜色:'),
+            'grid_color_swatch': Swatch(window, lambda: window.grid_color),
+            'set_grid_color': Button(window, self.icons['set'], (0, 0), 'midright', self.graph.set_grid_color, 'rect'),
+            'grid_alpha': Text(window, lambda: '网格不透明度:'+str(window.grid_alpha)),
+            'change_grid_alpha': Slider(window, (0, 0), scaled(SIDEBAR_WIDTH-20), scaled(10), 'topleft', scaled(20), lambda: window.grid_alpha/255, self.graph.set_grid_alpha),
+            'axis_color': Text(window, '坐标轴颜色:'),
+            'axis_color_swatch': Swatch(window, lambda: window.axis_color),
+            'set_axis_color': Button(window, self.icons['set'], (0, 0), 'midright', self.graph.set_axis_color, 'rect'),
+            'axis_alpha': Text(window, lambda: '坐标轴不透明度:'+str(window.axis_alpha)),
+            'change_axis_alpha': Slider(window, (0, 0), scaled(SIDEBAR_WIDTH-20), scaled(10), 'topleft', scaled(20), lambda: window.axis_alpha/255, self.graph.set_axis_alpha)}
+
+    def layout_settings(self, start) -> list:
+        w = self.widgets['settings']
+        names = ['return', 'bg_mode', 'change_bg_mode', 'set_bg', 'background']
+        t = w['bg_mode'].move((SIDEBAR_LEFT+scaled(10), start+scaled(20)))
+        w['change_bg_mode'].move((WINDOW_SIZE[0]-scaled(10), t.centery))
+        w['set_bg'].move((w['change_bg_mode'].rect.left-scaled(10), t.centery))
+        t = w['background'].move((SIDEBAR_LEFT+scaled(10), t.bottom))
         if self.window.bg_mode == 'color':
-            pygame.draw.rect(self.window.screen, self.window.bg_color,
-                             (t.right+5, t.centery-10, 20, 20), 0, 3)
-            pygame.draw.rect(self.window.screen, (255, 255, 255),
-                             (t.right+5, t.centery-10, 20, 20), 1, 3)
+            w['bg_color'].move((t.right+scaled(5), t.centery-scaled(10)))
+            names.append('bg_color')
         else:
-            t = self.window.draw_text(os.path.split(self.window.background)[
-                                      1], (t.right, t.centery), 'midleft', 0)
-            t = self.window.draw_text(
-                '蒙版不透明度:'+str(self.window.mask_alpha), (SIDEBAR_LEFT+10, t.bottom+10), 'topleft')
-            if 'change_mask_alpha' not in self.sliders:
-                self.sliders['change_mask_alpha'] = Slider(
-                    self.window, (SIDEBAR_LEFT+10, t.bottom+15), WINDOW_SIZE[0]-SIDEBAR_LEFT-20, 10, 'topleft', 20, lambda: self.window.mask_alpha/255, self.window.set_mask_alpha)
-            else:
-                self.sliders['change_mask_alpha'].move(
-                    (SIDEBAR_LEFT+10, t.bottom+15))
-            t = self.sliders['change_mask_alpha'].draw()
-
-        t = self.window.draw_text(
-            '主题颜色:', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft')
-        pygame.draw.rect(self.window.screen, self.window.main_color,
-                         (t.right+5, t.centery-10, 20, 20), 0, 3)
-        pygame.draw.rect(self.window.screen, (255, 255, 255),
-                         (t.right+5, t.centery-10, 20, 20), 1, 3)
-        if 'set_main_color' not in self.buttons:
-            self.buttons['set_main_color'] = Button(self.window, self.icons['set'], (
-                WINDOW_SIZE[0]-10, t.centery), 'midright', self.window.set_main_color, 'rect')
-        else:
-            self.buttons['set_main_color'].move((WINDOW_SIZE[0]-10, t.centery))
-        self.buttons['set_main_color'].draw()
-
-        t = self.window.draw_text(
-            '网格颜色:', (SIDEBAR_LEFT+10, t.bottom+10), 'topleft')
-        pygame.draw.rect(self.window.screen, self.window.grid_color,
-                         (t.right+5, t.centery-10, 20, 20), 0, 3)
-        pygame.draw.rect(self.window.screen, (255, 255, 255),
-                         (t.right+5, t.centery-10, 20, 20), 1, 3)
-        if 'set_grid_color' not in self.buttons:
-            self.buttons['set_grid_color'] = Button(self.window, self.icons['set'], (
-                WINDOW_SIZE[0]-10, t.centery), 'midright', self.graph.set_grid_color, 'rect')
-        else:
-            self.buttons['set_grid_color'].move((WINDOW_SIZE[0]-10, t.centery))
-        self.buttons['set_grid_color'].draw()
-
-        t = self.window.draw_text(
-            '网格不透明度:'+str(self.window.grid_alpha), (SIDEBAR_LEFT+10, t.bottom+10), 'topleft')
-        if 'change_grid_alpha' not in self.sliders:
-            self.sliders['change_grid_alpha'] = Slider(
-                self.window, (SIDEBAR_LEFT+10, t.bottom+15), WINDOW_SIZE[0]-SIDEBAR_LEFT-20, 10, 'topleft', 20, lambda: self.window.grid_alpha/255, self.graph.set_grid_alpha)
-        else:
-            self.sliders['change_grid_alpha'].move(
-                (SIDEBAR_LEFT+10, t.bottom+15))
-        start = self.sliders['change_grid_alpha'].draw().bottom
-
-        t = self.window.draw_text(
-            '坐标轴颜色:', (SIDEBAR_LEFT+10, start+10), 'topleft')
-        pygame.draw.rect(self.window.screen, self.window.axis_color,
-                         (t.right+5, t.centery-10, 20, 20), 0, 3)
-        pygame.draw.rect(self.window.screen, (255, 255, 255),
-                         (t.right+5, t.centery-10, 20, 20), 1, 3)
-        if 'set_axis_color' not in self.buttons:
-            self.buttons['set_axis_color'] = Button(self.window, self.icons['set'], (
-                WINDOW_SIZE[0]-10, t.centery), 'midright', self.graph.set_axis_color, 'rect')
-        else:
-            self.buttons['set_axis_color'].move((WINDOW_SIZE[0]-10, t.centery))
-        self.buttons['set_axis_color'].draw()
-
-        t = self.window.draw_text(
-            '坐标轴不透明度:'+str(self.window.axis_alpha), (SIDEBAR_LEFT+10, t.bottom+10), 'topleft')
-        if 'change_axis_alpha' not in self.sliders:
-            self.sliders['change_axis_alpha'] = Slider(
-                self.window, (SIDEBAR_LEFT+10, t.bottom+15), WINDOW_SIZE[0]-SIDEBAR_LEFT-20, 10, 'topleft', 20, lambda: self.window.axis_alpha/255, self.graph.set_axis_alpha)
-        else:
-            self.sliders['change_axis_alpha'].move(
-                (SIDEBAR_LEFT+10, t.bottom+15))
-        start = self.sliders['change_axis_alpha'].draw().bottom
-
-    def draw_calc(self, start) -> None:
-        self.buttons['return'].draw()
-
-        t = self.window.draw_text(
-            '三点计算函数解析式', (SIDEBAR_MID, start+20), 'midtop', 2)
-
-        if 'help' not in self.buttons:
-            self.buttons['help'] = Button(self.window, self.icons['help'], (
-                WINDOW_SIZE[0]-10, t.centery), 'midright', self.help_calc, 'rect', '计算原理')
-        else:
-            self.buttons['help'].move((WINDOW_SIZE[0]-10, t.centery))
-
-        t = self.window.draw_text(
-            '请先点击“设置”，再在网格中点击格线交点处', (SIDEBAR_MID, t.bottom+10), 'midtop', 0)
-
-        t = self.window.draw_text(
-            '点 1:'+str(self.graph.points[1] if 1 in self.graph.points else '未设置'), (SIDEBAR_LEFT+10, t.bottom+10), 'topleft')
-        if 'set_point_1' not in self.buttons:
-            self.buttons['set_point_1'] = Button(self.window, self.icons['set'], (
-                WINDOW_SIZE[0]-10, t.centery), 'midright', lambda: self.graph.set_point(1), 'rect')
-        else:
-            self.buttons['set_point_1'].move((WINDOW_SIZE[0]-10, t.centery))
-
-        t = self.window.draw_text(
-            '点 2:'+str(self.graph.points[2] if 2 in self.graph.points else '未设置'), (SIDEBAR_LEFT+10, t.bottom+10), 'topleft')
-        if 'set_point_2' not in self.buttons:
-            self.buttons['set_point_2'] = Button(self.window, self.icons['set'], (
-                WINDOW_SIZE[0]-10, t.centery), 'midright', lambda: self.graph.set_point(2), 'rect')
-        else:
-            self.buttons['set_point_2'].move((WINDOW_SIZE[0]-10, t.centery))
-
-        t = self.window.draw_text(
-            '点 3:'+str(self.graph.points[3] if 3 in self.graph.points else '未设置'), (SIDEBAR_LEFT+10, t.bottom+10), 'topleft')
-        if 'set_point_3' not in self.buttons:
-            self.buttons['set_point_3'] = Button(self.window, self.icons['set'], (
-                WINDOW_SIZE[0]-10, t.centery), 'midright', lambda: self.graph.set_point(3), 'rect')
-        else:
-            self.buttons['set_point_3'].move((WINDOW_SIZE[0]-10, t.centery))
-
-        if len(self.graph.points) == 3:
+            t = w['bg_image'].move((t.right, t.centery), 'midleft')
+            t = w['mask_alpha'].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+            w['change_mask_alpha'].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(15)))
+            t = w['change_mask_alpha'].bar_rect
+            names += ['bg_image', 'mask_alpha', 'change_mask_alpha']
+
+        for name in ('main_color', 'grid_color', 'axis_color'):
+            t = w[name].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+            w[name+'_swatch'].move((t.right+scaled(5), t.centery-scaled(10)))
+            w['set_'+name].move((WINDOW_SIZE[0]-scaled(10), t.centery))
+            names += [name, name+'_swatch', 'set_'+name]
+            if name != 'main_color':
+                alpha = name.replace('color', 'alpha')
+                t = w[alpha].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+                w['change_'+alpha].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(15)))
+                t = w['change_'+alpha].bar_rect
+                names += [alpha, 'change_'+alpha]
+        return names
+
+    def build_calc(self) -> dict:
+        graph = self.graph
+        widgets = {
+            'title': Text(self.window, self.pages['calc'], 3),
+            'return': Button(self.window, self.icons['return'], (0, 0), 'topleft', lambda: self.open('home'), 'circle', '返回'),
+            'subtitle': Text(self.window, '由点计算函数解析式', 2),
+            'help': Button(self.window, self.icons['help'], (0, 0), 'midright', self.help_calc, 'rect', '计算原理'),
+            'hint': Text(self.window, lambda: f'请在网格中点击放置点 {graph.picking[0]}（右键或Esc{"结束" if graph.adding else "取消"}）'
+                         if graph.picking else '拖动点可以移动，右键单击点可以删除' if graph.points
+                         else '请先点击“设置”，再在网格中点击格线交点处', 0),
+            'more': Text(self.window, lambda: f'更多的点:{len([i for i in graph.points if i > 3])}个'),
+            'add': Button(self.window, self.window.text_icon('添加', scaled((65, 30)), (255, 242, 0)), (0, 0), 'midright',
+                          graph.add_points, 'rect', '连续添加多个点，用最小二乘法拟合'),
+            'clear': Button(self.window, self.window.text_icon('清除', scaled((65, 30)), (255, 242, 0)), (0, 0), 'midright',
+                            lambda: graph.set_points({}), 'rect', '清除所有的点'),
+            'result': Text(self.window, '计算结果', 2),
+            'result_formula': Text(self.window, self.formula, lambda: 3 if len(self.formula()) < 12 else 2 if len(self.formula()) < 18 else 1, 1),
+            'result_a': Text(self.window, lambda: self.result_a, 1, 1),
+            'result_b': Text(self.window, lambda: self.result_b, 1, 1),
+            'result_c': Text(self.window, lambda: self.result_c, 1, 1),
+            'result_sse': Text(self.window, lambda: self.result_sse, 0)}
+        for i in (1, 2, 3):
+            widgets[f'point_{i}'] = Text(self.window, lambda i=i: f'点 {i}:'+str(
+                graph.points[i] if i in graph.points else '未设置'))
+            widgets[f'set_point_{i}'] = Button(self.window, self.icons['set'], (0, 0), 'midright',
+                                               lambda i=i: graph.set_point(i), 'rect')
+        return widgets
+
+    def layout_calc(self, start) -> list:
+        w = self.widgets['calc']
+        names = ['return', 'subtitle', 'help', 'hint', 'more', 'add', 'clear']
+        t = w['subtitle'].move((SIDEBAR_MID, start+scaled(20)), 'midtop')
+        w['help'].move((WINDOW_SIZE[0]-scaled(10), t.centery))
+        t = w['hint'].move((SIDEBAR_MID, t.bottom+scaled(10)), 'midtop')
+        for i in (1, 2, 3):
+            t = w[f'point_{i}'].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+            w[f'set_point_{i}'].move((WINDOW_SIZE[0]-scaled(10), t.centery))
+            names += [f'point_{i}', f'set_point_{i}']
+        t = w['more'].move((SIDEBAR_LEFT+scaled(10), t.bottom+scaled(10)))
+        w['clear'].move((WINDOW_SIZE[0]-scaled(10), t.centery))
+        w['add'].move((WINDOW_SIZE[0]-scaled(85), t.centery))
+        if self.graph.calcmode == 3:
+            start = w['result'].move((SIDEBAR_MID, t.bottom+scaled(10)), 'midtop').bottom
+            w['result_formula'].move((SIDEBAR_MID, start+scaled(10)), 'midtop')
+            start = w['result_a'].move((SIDEBAR_LEFT+scaled(10), start+scaled(70))).bottom
+            start = w['result_b'].move((SIDEBAR_LEFT+scaled(10), start+scaled(10))).bottom
+            t = w['result_c'].move((SIDEBAR_LEFT+scaled(10), start+scaled(10)))
+            names += ['result', 'result_formula',
+                      'result_a', 'result_b', 'result_c']
+            if len(self.graph.points) > 3:
+                w['result_sse'].move(
+                    (WINDOW_SIZE[0]-scaled(10), t.centery), 'midright')
+                names.append('result_sse')
+        return names
+
+    def solve(self) -> None:
+        """
+        用各点的拟合结果更新函数（点不变时不重复计算）。
+        """
+        result = self.graph.fit.solve()
+        if result:
             self.graph.calcmode = 3
-            if hash(tuple(sorted(self.graph.points.values()))) != self.points_hash:
-                self.points_hash = hash(
-                    tuple(sorted(self.graph.points.values())))
-                self.window.draw_text(
-                    '计算中...', (SIDEBAR_MID, t.bottom+10), 'midtop', 2)
-                self.window.update()
-                (x1, y1), (x2, y2), (x3, y3) = self.graph.points.values()
-                tmp = x1**2*x2 - x1**2*x3 - x1*x2**2 + x1*x3**2 + x2**2*x3 - x2*x3**2
-                t_a = -x1*y2 + x1*y3 + x2*y1 - x2*y3 - x3*y1 + x3*y2
-                t_b = x1**2*y2 - x1**2*y3 - x2**2*y1 + x2**2*y3 + x3**2*y1 - x3**2*y2
-                t_c = x1**2*x2*y3 - x1**2*x3*y2 - x1*x2**2 * \
-                    y3 + x1*x3**2*y2 + x2**2*x3*y1 - x2*x3**2*y1
-                self.graph.a = t_a/tmp
-                self.graph.b = t_b/tmp
-                self.graph.c = t_c/tmp
-                if tmp < 0:
-                    tmp = -tmp
-                    t_a = -t_a
-                    t_b = -t_b
-                    t_c = -t_c
-                g_a = gcd(t_a, tmp)
-                g_b = gcd(t_b, tmp)
-                g_c = gcd(t_c, tmp)
-                self.result_a = f'{t_a//g_a}/{tmp//g_a}' if tmp != g_a else f'{t_a//g_a}'
-                self.result_b = f'{t_b//g_b}/{tmp//g_b}' if tmp != g_b else f'{t_b//g_b}'
-                self.result_c = f'{t_c//g_c}/{tmp//g_c}' if tmp != g_c else f'{t_c//g_c}'
-            else:
-                text = self.formula()
-                start = self.window.draw_text(
-                    '计算结果', (SIDEBAR_MID, t.bottom+10), 'midtop', 2).bottom
-                self.window.draw_text(text, (SIDEBAR_MID, start+20), 'midtop',
-                                      3 if len(text) < 12 else 2 if len(text) < 18 else 1, 1)
-                start = self.window.draw_text(
-                    'a='+self.result_a,  (SIDEBAR_LEFT+10, start+80), 'topleft', 1, 1).bottom
-                start = self.window.draw_text(
-                    'b='+self.result_b, (SIDEBAR_LEFT+10, start+10), 'topleft', 1, 1).bottom
-                self.window.draw_text(
-                    'c='+self.result_c, (SIDEBAR_LEFT+10, start+10), 'topleft', 1, 1)
+            if self.graph.fit.version != self.fit_version:
+                self.fit_version = self.graph.fit.version
+                a, b, c, sse = result
+                self.graph.a = float(a)
+                self.graph.b = float(b)
+                self.graph.c = float(c)
+                self.result_a = self.coefficient_text('a', a)
+                self.result_b = self.coefficient_text('b', b)
+                self.result_c = self.coefficient_text('c', c)
+                self.result_sse = f'残差平方和:{my_round(float(sse), 4)}'
         else:
             self.graph.calcmode = 2
 
-        self.buttons['set_point_1'].draw()
-        self.buttons['set_point_2'].draw()
-        self.buttons['set_point_3'].draw()
-        self.buttons['help'].draw()
+    def coefficient_text(self, name: str, value: Fraction) -> str:
+        """
+        系数能写成较短的分数时显示分数，否则显示近似的小数。
+        """
+        if len(str(value)) <= 12:
+            return f'{name}={value}'
+        return f'{name}≈{my_round(float(value), 4)}'
 
     def help_calc(self) -> None:
-        easygui.msgbox("""将三点坐标分别带入解析式并联立成三元一次方程组：
-x1²a+x1b+c=0,
-x2²a+x2b+c=0,
-x3²a+x3b+c=0.
-解出a,b,c的值即为函数各项系数。""", '计算原理')
+        self.window.message("""将三点坐标分别带入解析式并联立成三元一次方程组：
+x1²a+x1b+c=y1,
+x2²a+x2b+c=y2,
+x3²a+x3b+c=y3.
+解出a,b,c的值即为函数各项系数。
+多于三个点时一般没有经过所有点的抛物线，改用最小二乘法：
+选取使各点处(axᵢ²+bxᵢ+c-yᵢ)²之和（残差平方和）最小的a,b,c。""", '计算原理')
+
 
     def open(self, page) -> None:
         self.page = page
-        self.page_open_time = time.time()
+        self.transition = Tween(self.window, 0.3)
+        self.window.damage_all()
+        self.graph.stop_picking()
         if page == 'home':
             self.open_home()
-        elif page == 'settings':
-            self.open_settings()
         elif page == 'calc':
             self.open_calc()
+        self.key = None
+        self.layout(scaled(100))
 
     def open_home(self) -> None:
-        self.points_hash = 0
         self.graph.calcmode = 1
-        self.graph.points = {}
-        self.buttons = {'calc': Button(self.window, self.icons['calc'], (SIDEBAR_LEFT+10, WINDOW_SIZE[1]-60), 'topleft', lambda: self.open('calc'), 'circle', '计算'),
-                        'settings': Button(self.window, self.icons['settings'],
-                                           (WINDOW_SIZE[0]-60, WINDOW_SIZE[1]-60), 'topleft', lambda: self.open('settings'), 'circle', '设置')}
-        self.sliders = {'a': Slider(self.window, (0, 0), WINDOW_SIZE[0]-SIDEBAR_LEFT-180, 10, 'midleft', 20,  self.graph.get_a, self.graph.set_a, self.graph.set_a_d, '二次项系数a'),
-                        'b': Slider(self.window, (0, 0), WINDOW_SIZE[0]-SIDEBAR_LEFT-180, 10, 'midleft', 20,  self.graph.get_b, self.graph.set_b, self.graph.set_b_d, '一次项系数b'),
-                        'c': Slider(self.window, (0, 0), WINDOW_SIZE[0]-SIDEBAR_LEFT-180, 10, 'midleft', 20,  self.graph.get_c, self.graph.set_c, self.graph.set_c_d, '常数项c')}
-
-    def open_settings(self) -> None:
-        self.buttons = {'return': Button(self.window, self.icons['return'],
-                                         (SIDEBAR_LEFT+10, 10), 'topleft', lambda: self.open('home'), 'circle', '返回')}
-        self.sliders = {}
+        self.graph.set_points({})
 
     def open_calc(self) -> None:
-        self.buttons = {'return': Button(self.window, self.icons['return'],
-                                         (SIDEBAR_LEFT+10, 10), 'topleft', lambda: self.open('home'), 'circle', '返回')}
-        self.sliders = {}
+        self.graph.calcmode = 2
 
 
-if __name__ == '__main__':
-    cp = ConfigParser()
-    if os.path.isfile('config.ini'):
+class Exporter:
+    """
+    离屏渲染抛物线图像（批量导出时每个进程各有一个）。
+    """
+
+    def __init__(self, size: tuple, panel: bool, config_path: str = 'config.ini') -> None:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        # 使用用户的颜色设置，但不写回配置文件
+        cp = Config(None)
         try:
-            cp.read('config.ini', encoding='utf-8')
+            cp.read(config_path, encoding='utf-8')
+            # 分析面板按默认的窗口尺寸排版
+            cp.remove_option('window', 'size')
         except:
             pass
+        self.window = Window(cp)
+        self.screen = self.window.screen
+        self.graph = Graph(self.window, size)
+        self.canvas = counted(pygame.Surface(size).convert(), 2)
+        self.sidebar = Sidebar(self.window, self.graph) if panel else None
+
+    def render(self, kind: str, values: tuple) -> pygame.Surface:
+        """
+        渲染一条抛物线：kind为'abc'时values是系数，为'points'时values是要拟合的点。
+        """
+        window, graph = self.window, self.graph
+        if kind == 'points':
+            graph.set_points(enumerate(values, 1))
+            graph.a, graph.b, graph.c = map(float, graph.fit.solve()[:3])
+            graph.calcmode = 3
+        else:
+            graph.a, graph.b, graph.c = values
+            graph.set_points({})
+            graph.calcmode = 1
+        # 视图包含顶点、与坐标轴的交点和已知点
+        a, b, c = graph.a, graph.b, graph.c
+        keys = [(0, c)]+list(graph.points.values())
+        if a:
+            analysis = graph.analysis()
+            keys += [(analysis.h, analysis.k), (2*analysis.h, c)] + \
+                [(x, 0) for x in analysis.roots]
+        elif b:
+            keys.append((-c/b, 0))
+        graph.fit_view(keys)
+
+        window.screen = self.canvas
+        window.screen.fill(window.bg_color)
+        graph.draw()
+        image = self.canvas
+        if self.sidebar:
+            # 分析面板按原尺寸排版，再缩放到与图像同高
+            window.screen = self.screen
+            window.screen.fill(window.bg_color)
+            self.sidebar.layout()
+            for widget in self.sidebar.visible:
+                if isinstance(widget, Text):
+                    widget.draw()
+            w, h = graph.size
+            panel = counted(pygame.transform.smoothscale(self.screen.subsurface(
+                (SIDEBAR_LEFT, 0, WINDOW_SIZE[0]-SIDEBAR_LEFT, WINDOW_SIZE[1])),
+                (round((WINDOW_SIZE[0]-SIDEBAR_LEFT)*h/WINDOW_SIZE[1]), h)), 2)
+            image = counted(pygame.Surface((w+panel.get_width(), h)))
+            image.blit(self.canvas, (0, 0))
+            image.blit(panel, (w, 0))
+            pygame.draw.line(image, window.main_color, (w, 0), (w, h), 3)
+        window.screen = self.screen
+        window.damaged.clear()
+        return image
+
+
+exporter = None
+
+
+def build_atlases(args) -> None:
+    """
+    预先生成界面字体各字号的字形图集，打包时随程序发布，第一次启动就不必逐字渲染。
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    window = Window(Config(None))
+    chars = ui_chars()
+    for size in range(4):
+        atlas = GlyphAtlas(window, 0, size, args.output)
+        atlas.add(chars)
+        atlas.save()
+    print(f'已生成{len(chars)}个字符的图集到{args.output}')
+
+
+def init_exporter(size: tuple, panel: bool) -> None:
+    global exporter
+    exporter = Exporter(size, panel)
+
+
+def save_png(surface: pygame.Surface, path: str, level: int = 3) -> None:
+    """
+    保存为PNG（不做行过滤、使用较低的压缩级别，比pygame.image.save快约3倍，文件略大）。
+    """
+    def chunk(kind, data):
+        return len(data).to_bytes(4, 'big')+kind+data+zlib.crc32(kind+data).to_bytes(4, 'big')
+    w, h = surface.get_size()
+    rows = np.zeros((h, w*3+1), np.uint8)
+    rows[:, 1:] = pygame.surfarray.pixels3d(
+        surface).swapaxes(0, 1).reshape(h, -1)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n'+chunk(b'IHDR', w.to_bytes(4, 'big')+h.to_bytes(4, 'big')+bytes((8, 2, 0, 0, 0)))
+                + chunk(b'IDAT', zlib.compress(rows.tobytes(), level))+chunk(b'IEND', b''))
+
+
+def export_image(task: tuple) -> str:
+    """
+    导出一张图片，出错时返回提示（不影响其余任务），成功时返回None。
+    """
+    lineno, kind, values, path = task
+    try:
+        save_png(exporter.render(kind, values), path)
+    except Exception as e:
+        return f'第{lineno}行: 导出失败（{type(e).__name__}: {e}）'
+
+
+def read_export_jobs(path: str) -> tuple:
+    """
+    读取要导出的抛物线：每行为"a b c"三个系数或"x1 y1 x2 y2 x3 y3 ..."三个或更多的点（可用逗号分隔，#开头为注释）。
+    返回[(行号, 类型, 数值)]和出错行的提示。
+    """
+    jobs, errors = [], []
+    with open(path, encoding='utf-8') as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.split('#')[0].replace(',', ' ').split()
+            if not line:
+                continue
+            try:
+                values = [my_round(float(i), 6) for i in line]
+            except ValueError:
+                errors.append(f'第{lineno}行: 不是数字')
+                continue
+            if len(values) == 3:
+                jobs.append((lineno, 'abc', tuple(values)))
+            elif len(values) >= 6 and len(values) % 2 == 0:
+                points = tuple(zip(values[::2], values[1::2]))
+                if not QuadraticFit(points).solve():
+                    errors.append(f'第{lineno}行: 至少要有三个横坐标不同的点')
+                    continue
+                jobs.append((lineno, 'points', points))
+            else:
+                errors.append(f'第{lineno}行: 应为3个系数或至少3个点的坐标')
+    return jobs, errors
+
+
+def parse_size(text: str) -> tuple:
+    try:
+        w, h = map(int, text.lower().split('x'))
+        assert(w >= 100 and h >= 100)
+    except:
+        raise argparse.ArgumentTypeError('尺寸应为"宽x高"，且不小于100x100')
+    return (w, h)
+
+
+def export_images(args) -> None:
+    """
+    批量导出图像，多条抛物线时分给多个进程渲染。
+    """
+    jobs, errors = read_export_jobs(args.input)
+    for error in errors:
+        print(error, file=sys.stderr)
+    os.makedirs(args.output, exist_ok=True)
+    tasks = [(lineno, kind, values, os.path.join(args.output, f'{lineno:04d}.png'))
+             for lineno, kind, values in jobs]
+    start = time.perf_counter()
+    workers = min(args.jobs or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        init_exporter(args.size, args.panel)
+        failed = [error for error in map(export_image, tasks) if error]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers, initializer=init_exporter, initargs=(args.size, args.panel)) as pool:
+            # 每个进程只初始化一次，任务成批分发以减少进程间通信
+            failed = [error for error in pool.map(export_image, tasks, chunksize=max(1, len(tasks)//(workers*4)))
+                      if error]
+    for error in failed:
+        print(error, file=sys.stderr)
+    print(f'已导出{len(tasks)-len(failed)}张图片到{args.output}（{workers}个进程，{time.perf_counter()-start:.1f} s）')
+
+
+def read_coefficients(lines: list, cols: tuple, lineno: int) -> np.ndarray:
+    """
+    把一块CSV行解析为n×3的系数数组；有错误的行提示后跳过（lineno为第一行的行号）。
+    """
+    try:
+        return np.loadtxt(lines, delimiter=',', usecols=cols, ndmin=2)
+    except ValueError:
+        rows = []
+        for i, line in enumerate(lines, lineno):
+            fields = line.split(',')
+            if not line.strip():
+                continue
+            try:
+                rows.append([float(fields[col]) for col in cols])
+            except (ValueError, IndexError):
+                print(f'第{i}行: 格式有误，已跳过', file=sys.stderr)
+        return np.array(rows, float).reshape(-1, 3)
+
+
+def analyze_csv(args) -> None:
+    """
+    逐块读取a,b,c系数的CSV并写出分析结果，内存占用只与块大小有关。
+    """
+    src = open(args.input, encoding='utf-8', newline='') if args.input != '-' else sys.stdin
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output != '-' else sys.stdout
+    with src, out:
+        # 第一行含有a、b、c列名时是表头，按列名找系数；否则第一行也是数据，取前三列（有误时按行提示）
+        first = src.readline()
+        if not first:
+            print('输入为空，没有可分析的数据', file=sys.stderr)
+        cols, pending, lineno = (0, 1, 2), [first] if first else [], 1
+        names = [i.strip().strip('"').lower() for i in first.split(',')]
+        if all(name in names for name in 'abc'):
+            cols = tuple(names.index(name) for name in 'abc')
+            pending, lineno = [], 2
+        out.write('a,b,c,h,k,delta,count,x1,x2,opens_up\n')
+        row = '%.10g,%.10g,%.10g,%.10g,%.10g,%.10g,%d,%.10g,%.10g,%d\n'
+        rows = 0
+        while True:
+            lines = pending+list(itertools.islice(src, args.chunk-len(pending)))
+            pending = []
+            if not lines:
+                break
+            data = read_coefficients(lines, cols, lineno)
+            lineno += len(lines)
+            result = analyze_batch(data[:, 0], data[:, 1], data[:, 2])
+            table = np.column_stack([data]+[result[name] for name in
+                                            ('h', 'k', 'delta', 'count', 'x1', 'x2', 'opens_up')])
+            # 整块一次格式化（比逐行快），不存在的值（NaN）留空
+            out.write((row*len(table) % tuple(table.ravel().tolist())).replace('nan', ''))
+            rows += len(data)
+    print(f'已分析{rows}个函数', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    if getattr(sys, 'frozen', False):
+        # 打包后的程序启动导出进程池时需要
+        import multiprocessing
+        multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description=WINDOW_TITLE)
+    parser.add_argument('--startup-report', action='store_true',
+                        help='打印启动各阶段耗时')
+    parser.add_argument('--asset-report', action='store_true',
+                        help='打印各图标资源的内存占用')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='记录每一帧的耗时，退出时保存到FILE（.json为Chrome trace格式，其他为CSV）')
+    commands = parser.add_subparsers(dest='command')
+    export = commands.add_parser('export', help='批量导出抛物线图像')
+    export.add_argument('input', help='每行为"a b c"或"x1 y1 x2 y2 x3 y3 ..."的文本文件')
+    export.add_argument('-o', '--output', default='export',
+                        help='输出目录（图片按输入文件的行号命名）')
+    export.add_argument('--size', type=parse_size, default=(SIDEBAR_LEFT, WINDOW_SIZE[1]),
+                        help='绘图区尺寸，如800x600')
+    export.add_argument('--panel', action='store_true',
+                        help='在图像右侧附上分析面板')
+    export.add_argument('-j', '--jobs', type=int,
+                        help='渲染进程数（默认为CPU核数）')
+    analyze = commands.add_parser('analyze', help='批量分析CSV中的二次函数（可生成答案）')
+    analyze.add_argument('input', help='a,b,c系数的CSV文件（可带表头），-表示标准输入')
+    analyze.add_argument('-o', '--output', default='-',
+                         help='结果CSV文件，默认输出到标准输出')
+    analyze.add_argument('--chunk', type=int, default=100000,
+                         help='每次读取的行数')
+    atlas = commands.add_parser('atlas', help='预先生成字形图集（打包前运行）')
+    atlas.add_argument('-o', '--output', default=GLYPH_BUNDLE_DIR,
+                       help='输出目录')
+    args = parser.parse_args()
+    if args.command == 'atlas':
+        build_atlases(args)
+        sys.exit()
+    elif args.command == 'export':
+        export_images(args)
+        sys.exit()
+    elif args.command == 'analyze':
+        analyze_csv(args)
+        sys.exit()
+    startup.mark('import')
+
+    cp = Config()
+    cp.load()
+    startup.mark('config')
     window = Window(cp)
+    profiler = window.profiler
+    if args.profile:
+        profiler.record(args.profile)
+    startup.mark('window')
     graph = Graph(window)
+    startup.mark('graph')
     sidebar = Sidebar(window, graph)
+    startup.mark('sidebar')
+    window.draw_frame()
+    graph.draw()
+    sidebar.draw()
+    window.draw_dialogs()
+    window.update()
+    startup.mark('first frame')
+    if args.startup_report:
+        print(startup.report(), flush=True)
+    if args.asset_report:
+        print(window.assets.report(), flush=True)
 
     while True:
-        window.draw_frame()
-        graph.draw()
-        sidebar.draw()
-        window.update()
+        if window.need_redraw():
+            sweep = window.sweep
+            if sweep:
+                sweep.advance()
+            window.draw_frame()
+            profiler.mark('draw_frame')
+            graph.draw()
+            profiler.mark('graph.draw')
+            sidebar.draw()
+            profiler.mark('sidebar.draw')
+            if sweep:
+                sweep.capture()
+            window.draw_dialogs()
+            profiler.mark('dialogs')
+            profiler.draw()
+            window.update()
+            profiler.mark('update')
+        profiler.end()
         for event in window.process_events():
-            if event.type == pygame.MOUSEBUTTONDOWN:
+            if window.dialogs:
+                window.dialogs[-1].process_event(event)
+            elif event.type == pygame.MOUSEMOTION:
+                graph.process_motion_event(event.pos)
+            elif event.type == pygame.MOUSEWHEEL:
+                graph.process_wheel_event(window.mouse_pos, event.y)
+            elif event.type == pygame.KEYDOWN:
+                graph.process_key_event(event.key)
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                graph.process_click_event(event.pos, event.button)
                 for button in sidebar.buttons.values():
                     button.process_click_event(event.pos)
                 for slider in sidebar.sliders.values():
                     slider.process_click_event(event.pos)
             elif event.type == pygame.MOUSEBUTTONUP:
+                graph.process_release_event(event.pos, event.button)
                 for slider in sidebar.sliders.values():
                     slider.process_release_event(event.pos)
+        profiler.mark('events')
@@ -8,7 +8,7 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('icons','icons'),('CascadiaCode.ttf','.'),('FZFWQingYinTiJWL.ttf','.')],
+    datas=[('icons','icons'),('glyphs','glyphs'),('CascadiaCode.ttf','.'),('FZFWQingYinTiJWL.ttf','.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},